@@ -37,11 +37,17 @@ from .ipython import setup_breakpoint
 from .ipython import start_ipython
 from .ipython import start_ipython as enter_ipython  # alias
 from .subproc import Activity
+from .subproc import arun_cmd_args
+from .subproc import arun_cmd_line
 from .subproc import bg
 from .subproc import coro_mgr as coro
 from .subproc import new_thread
+from .subproc import parallel_imap
+from .subproc import parallel_map
 from .subproc import run_cmd_args
+from .subproc import run_cmd_batch
 from .subproc import run_cmd_line
+from .subproc import run_cmd_pipeline
 from .subproc import run_new_thread
 from .text_slicer import slice
 from .textwrap import wrap as dedent
@@ -2,17 +2,33 @@ from . import subprocess
 from .background_activity import Activity
 from .background_activity import bg
 from .coroutine import coro_mgr
-# from .multi_process import new_process
+from .interpreter_pool import InterpreterPool
+from .multiprocess import ProcessPool
+from .multiprocess import new_process
+from .multiprocess import process_pool
+from .parallel import parallel_imap
+from .parallel import parallel_map
+from .pipeline import Pipeline
 from .promise import Promise
 from .promise import defer
+from .resource_usage import ResourceUsage
+from .subprocess import CmdResult
 from .subprocess import Popen
+from .subprocess import arun_cmd_args
+from .subprocess import arun_cmd_batch
+from .subprocess import arun_cmd_line
 from .subprocess import compose_cmd
+from .subprocess import process_registry
 from .subprocess import run_cmd_args
+from .subprocess import run_cmd_batch
 from .subprocess import run_cmd_line
+from .subprocess import run_cmd_pipeline
 from .threading import Thread
 from .threading import Thread as ThreadBroker  # backward compatibility
 from .threading import Thread as ThreadWorker  # backward compatibility
+from .threading import WorkerPool
 from .threading import new_thread
 from .threading import retrieve_thread
 from .threading import run_new_thread
+from .threading import set_thread_pool
 from .threading import thread_manager
@@ -1,16 +1,32 @@
 import typing as t
 from contextlib import contextmanager
 from dataclasses import dataclass
-from time import sleep
+from functools import partial
+from heapq import heapify
+from heapq import heappop
+from heapq import heappush
+from math import ceil
+from random import uniform
+from threading import Condition
+from threading import Lock
 from time import time
 from types import GeneratorType
+from .threading import WorkerPool
 from .threading import new_thread
 
 
 class Activity:
     state: t.Literal['idle', 'running', 'paused', 'stopped', 'cancelled']
+    _call: t.Optional[t.Callable[[], t.Any]] = None
+    #   for a periodic activity, the task bound with the arguments of
+    #   `start`.
+    _on_cancel: t.Optional[t.Callable[[], None]] = None
+    #   set by the manager, to remove it from the background loop.
+    _on_change: t.Optional[t.Callable[[], None]] = None
+    #   set by the manager, to wake up the background loop.
     _process: t.Generator
     _remark: str
+    _schedule: t.Optional['_Schedule'] = None
     _task: t.Optional[t.Callable[[...], t.Generator]]
 
     @property
@@ -39,9 +55,13 @@ class Activity:
 
     def start(self, *args, **kwargs) -> 'Activity':
         self.state = 'running'
-        if self._task:
+        if self._schedule:
+            self._call = partial(self._task, *args, **kwargs)
+            self._schedule.next_time = None  # the first run is at once.
+        elif self._task:
             self._process = self._task(*args, **kwargs)
             assert isinstance(self._process, GeneratorType)
+        self._notify()
         return self
 
     def pause(self) -> None:
@@ -51,6 +71,7 @@ class Activity:
         # assert self.state == 'paused'
         # assert self.state not in ('stopped', 'cancelled')
         self.state = 'running'
+        self._notify()
 
     def stop(self) -> None:
         # currently this state is equal to "paused"
@@ -63,21 +84,47 @@ class Activity:
 
     def cancel(self) -> None:
         self.state = 'cancelled'
-        # wait for background loop to recycle it.
+        if self._on_cancel:
+            self._on_cancel()
+
+    def _notify(self) -> None:
+        if self._on_change:
+            self._on_change()
 
 
 class BackgroundActivityManager:
+    """
+    the background loop is started when the first activity is registered,
+    and quits when there is no activity.
+    each round runs one step of every running activity. the loop blocks on
+    a condition when nothing is runnable, and is waked up by a new or
+    resumed activity, or by the nearest deadline of `delay`.
+    """
+
+    interval: float = 50e-3
+    #   the schedule of the loop: a step which does not yield a delay is
+    #   followed by the next step after this time.
     busy: bool
     _activities: t.Dict[int, Activity]
     _activiting: bool
+    _cond: Condition
+    _deadlines: t.List[t.Tuple[float, int]]
+    #   a heap of (time_point, activity_id).
+    _looping: bool
+    _pool: t.Optional[WorkerPool]
+    #   runs the periodic activities, created at the first run.
     _timer: t.Dict[int, float]
 
     def __init__(self) -> None:
         self.busy = False
         self._activities = {}
         self._activiting = False
+        self._lock = Lock()
+        self._cond = Condition(self._lock)
+        self._deadlines = []
+        self._looping = False
+        self._pool = None
         self._timer = {}
-        self._mainloop()
 
     def __bool__(self) -> bool:
         return bool(self._activities)
@@ -85,6 +132,7 @@ class BackgroundActivityManager:
     def close(self) -> None:
         self._activities.clear()
         self._activiting = False
+        self._deadlines.clear()
         self._timer.clear()
 
     @staticmethod
@@ -99,7 +147,11 @@ class BackgroundActivityManager:
 
         suggestion:
             if your task needs long delay (e.g. >=1s), use this function; else 
-            no need to use -- just follow the background loop's schedule.
+            no need to use -- just follow the background loop's schedule
+            (see `interval`).
+            `yield bg.delay(0)` runs the next step in the next round at once,
+            for the tasks which need throughput. be careful, it keeps the
+            loop busy.
         """
         return _Delay(sec)
 
@@ -107,80 +159,241 @@ class BackgroundActivityManager:
         self,
         task: t.Union[t.Callable[[...], t.Generator], t.Generator],
         remark: str = '',
+        every: float = None,
+        jitter: float = 0,
+        max_concurrency: int = 1,
+        missed: t.Literal['skip', 'catch-up', 'coalesce'] = 'skip',
     ) -> Activity:
-        if isinstance(task, GeneratorType):
+        """
+        params:
+            task: a generator function, each step runs in the background
+                loop. if `every` is given, it is a plain function instead,
+                which is called on the worker pool every `every` seconds.
+            every: run periodically. the cadence follows a fixed grid from
+                the start time, so it does not drift with the run time.
+            jitter: delay each run by a random time within [0, jitter]
+                seconds, to spread the runs of many activities.
+            max_concurrency: max runs of this activity at the same time.
+            missed: what to do with the runs that are due while
+                `max_concurrency` runs are still in progress (or while the
+                activity is suspended):
+                'skip': drop them, and wait for the next tick.
+                'catch-up': run all of them when the workers are free. the
+                    ticks during `suspending` are not counted.
+                'coalesce': merge them into one run when a worker is free.
+        usage:
+            act = bg.register_activity(
+                check_health, every=30, jitter=1, missed='coalesce'
+            ).start(url)
+        """
+        if every:
+            assert callable(task) and not isinstance(task, GeneratorType)
+            assert missed in ('skip', 'catch-up', 'coalesce')
+            act = Activity(task, remark)
+            act._schedule = _Schedule(every, jitter, max_concurrency, missed)
+        elif isinstance(task, GeneratorType):
             print(
                 'directly registering a generator as activity is deprecated. '
                 'use callable instead.',
                 ':v5p',
             )
-            act = self._activities[id(task)] = Activity(
-                None, remark, _generator=task
-            )
+            act = Activity(None, remark, _generator=task)
         else:
             assert callable(task)
-            act = self._activities[id(task)] = Activity(task, remark)
+            act = Activity(task, remark)
+        # keyed by the activity, so one task can be registered many times,
+        # e.g. with different arguments for `start`.
+        act._on_cancel = partial(self._on_cancel, id(act), act)
+        act._on_change = self._wakeup
+        with self._lock:
+            self._activities[id(act)] = act
+            if not self._looping:
+                self._looping = True
+                self._mainloop()
+            else:
+                self._cond.notify()
         return act
 
+    def set_pool(self, max_workers: int) -> None:
+        """
+        set the size of the worker pool for periodic activities. by default,
+        the pool is created at the first run with the default size of
+        `WorkerPool`.
+        """
+        with self._lock:
+            old, self._pool = self._pool, WorkerPool(max_workers)
+        if old:
+            old.shutdown(wait=False)
+
     @contextmanager
     def suspending(self) -> t.Iterator:
         """
         suspend all background activities.
+        the runs of periodic activities which are already on the worker pool
+        are not waited for. the ticks of periodic activities during the
+        suspension are dropped, even if `missed` is 'catch-up'.
         """
-        self.busy = True
-        while self._activiting:
-            sleep(10e-3)
-        yield
-        self.busy = False
+        with self._cond:
+            self.busy = True
+            self._cond.wait_for(lambda: not self._activiting)
+        start = time()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.busy = False
+                self._skip_ticks(start, time())
+                self._cond.notify_all()
 
     # def unregister_activity(self, task_id: int) -> None:
     #     self._activities.pop(task_id)
 
-    @new_thread()
+    @new_thread(group='lk_utils')
     def _mainloop(self) -> None:
         while True:
-            if self.busy or not self._activities:
-                sleep(3)
-                continue
-            
-            self._activiting = True
-            for id in tuple(self._activities.keys()):
+            with self._cond:
+                while True:
+                    if not self._activities:
+                        self._looping = False
+                        return
+                    now = time()
+                    while self._deadlines and self._deadlines[0][0] <= now:
+                        time_point, id = heappop(self._deadlines)
+                        if self._timer.get(id) == time_point:
+                            del self._timer[id]
+                    if not self.busy:
+                        ids = [
+                            k for k, v in self._activities.items()
+                            if v.state == 'running' and k not in self._timer
+                        ]
+                        if ids:
+                            break
+                    self._cond.wait(
+                        self._deadlines[0][0] - now
+                        if self._deadlines and not self.busy else None
+                    )
+                self._activiting = True
+
+            for id in ids:
                 # print(id, ':iv')
                 if self.busy:  # check busy again, in the key point.
                     break
-                if self._timer.get(id):
-                    if time() > self._timer[id]:
-                        self._timer.pop(id)
-                    else:
-                        sleep(10e-3)
-                        continue
-
-                act = self._activities[id]
+                if (act := self._activities.get(id)) is None:
+                    continue
                 if act.state == 'running':
+                    if act._schedule:
+                        self._tick(id, act)
+                        continue
                     try:
                         x = next(act)
                     except StopIteration:
                         print(':v7', 'remove finished activity', act)
-                        self._activities.pop(id)
+                        self._remove(id)
                     except RuntimeError as e:
                         if str(e).lower() == 'signal source has been deleted':
                             print(':v8', 'entirely close backgroup loop')
-                            self.close()
+                            with self._cond:
+                                self.close()
+                                self._looping = False
+                                self._cond.notify_all()
                             return
                     except Exception as e:
                         print(':e', e)
                         print(':v8', 'force remove broken activity', act)
-                        self._activities.pop(id)
+                        self._remove(id)
                     else:
-                        if x and isinstance(x, _Delay):
-                            self._timer[id] = time() + x.value
-                    finally:
-                        sleep(5e-3)
-                elif act.state == 'cancelled':
-                    print(':v7', 'recycle cancelled activity', act)
-                    self._activities.pop(id)
-            self._activiting = False
-            sleep(50e-3)
+                        if isinstance(x, _Delay):
+                            sec = x.value
+                        else:
+                            sec = self.interval
+                        if sec > 0:
+                            with self._lock:
+                                if id not in self._activities:
+                                    continue  # cancelled in the step.
+                                time_point = self._timer[id] = time() + sec
+                                heappush(self._deadlines, (time_point, id))
+
+            with self._cond:
+                self._activiting = False
+                self._cond.notify_all()  # for `suspending`.
+
+    def _on_run_done(self, act: Activity, _: t.Any) -> None:
+        schedule = act._schedule
+        with self._lock:
+            schedule.running -= 1
+            count = schedule.take() if act.state == 'running' else 0
+        self._submit(act, count)
+
+    def _on_cancel(self, id: int, act: Activity) -> None:
+        print(':v7', 'recycle cancelled activity', act)
+        self._remove(id, act)
+
+    def _remove(self, id: int, act: Activity = None) -> None:
+        with self._cond:
+            if (x := self._activities.get(id)) is None or act and x is not act:
+                return  # removed, or the id is taken by a newer activity.
+            del self._activities[id]
+            if self._timer.pop(id, None) is not None:
+                self._deadlines = [x for x in self._deadlines if x[1] != id]
+                heapify(self._deadlines)
+            self._cond.notify_all()  # the loop may quit, or sleep longer.
+
+    def _skip_ticks(self, start: float, end: float) -> None:
+        """
+        move the periodic activities over the ticks within [start, end). the
+        ticks before `start` are kept, so they are still counted by `_tick`.
+        must be called with the lock held.
+        """
+        for act in self._activities.values():
+            if (schedule := act._schedule) is None:
+                continue
+            if schedule.next_time is None or schedule.next_time >= end:
+                continue
+            every = schedule.every
+            kept = max(0, ceil((start - schedule.next_time) / every))
+            skipped = ceil((end - schedule.next_time) / every) - kept
+            schedule.next_time += skipped * every
+
+    def _submit(self, act: Activity, count: int) -> None:
+        if not count:
+            return
+        with self._lock:
+            if self._pool is None:
+                self._pool = WorkerPool()
+            pool = self._pool
+        for _ in range(count):
+            pool.submit(act._call).add_done_callback(
+                partial(self._on_run_done, act)
+            )
+
+    def _tick(self, id: int, act: Activity) -> None:
+        schedule = act._schedule
+        now = time()
+        with self._lock:
+            if id not in self._activities:
+                return  # cancelled.
+            if schedule.next_time is None:
+                schedule.next_time = now
+            due = max(0, int((now - schedule.next_time) // schedule.every) + 1)
+            schedule.next_time += due * schedule.every
+            if schedule.missed == 'catch-up':
+                schedule.pending += due
+            elif schedule.missed == 'coalesce':
+                schedule.pending = min(schedule.pending + due, 1)
+            else:
+                schedule.pending = min(due, 1)
+            count = schedule.take()
+            if schedule.missed == 'skip':
+                schedule.pending = 0
+            time_point = self._timer[id] = (
+                schedule.next_time + uniform(0, schedule.jitter)
+            )
+            heappush(self._deadlines, (time_point, id))
+        self._submit(act, count)
+
+    def _wakeup(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
 
 
 @dataclass
@@ -188,4 +401,27 @@ class _Delay:
     value: float
 
 
+@dataclass
+class _Schedule:
+    every: float
+    jitter: float
+    max_concurrency: int
+    missed: str
+    next_time: t.Optional[float] = None  # the next tick, without jitter.
+    pending: int = 0  # due runs waiting for a free slot.
+    running: int = 0
+
+    def take(self) -> int:
+        """
+        take pending runs as many as the free slots. must be called with the
+        lock of the manager held.
+        """
+        count = min(self.pending, self.max_concurrency - self.running)
+        if count > 0:
+            self.pending -= count
+            self.running += count
+            return count
+        return 0
+
+
 bg = BackgroundActivityManager()
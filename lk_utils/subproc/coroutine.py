@@ -3,7 +3,13 @@ import time
 import typing as t
 from collections import deque
 from functools import partial
+from heapq import heappop
+from heapq import heappush
+from itertools import count
+from threading import Condition
+from threading import Lock
 from threading import Thread
+from threading import local
 from types import FunctionType
 from types import GeneratorType
 
@@ -52,8 +58,11 @@ class Task:
             self._list.clear()
     
     def __init__(self, id: str, func: FunctionType, singleton: bool) -> None:
+        self._cancelled = False
         self._cancelled_callbacks = {}
+        self._cond = Condition()
         self._crashed_callbacks = {}
+        self._error = None
         self._finished_callbacks = {}
         self._id = id
         self._over = None  # True, False, None
@@ -67,6 +76,40 @@ class Task:
         self._target_func = func
         self._target_inst = None
         self._updated_callbacks = {}
+        self._waiters = []  # one-shot callbacks, called when task is over.
+    
+    def __await__(self) -> t.Generator[t.Any, None, t.Any]:
+        """
+        usage:
+            async def main():
+                result = await my_task
+                # or: await asyncio.gather(task1, task2, ...)
+        if the task crashes, the error is raised; if it is cancelled,
+        `asyncio.CancelledError` is raised.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        def settle(outcome: t.Tuple[bool, t.Any, t.Any]) -> None:
+            if future.done():
+                return
+            cancelled, error, result = outcome
+            if cancelled:
+                future.cancel()
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        
+        def wakeup() -> None:
+            outcome = (self._cancelled, self._error, self._result.get())
+            try:
+                loop.call_soon_threadsafe(settle, outcome)
+            except RuntimeError:  # the loop is closed.
+                pass
+        
+        self._add_waiter(wakeup)
+        return (yield from future.__await__())
     
     def __call__(self, *args, **kwargs) -> 'Task':
         self.run(*args, **kwargs)
@@ -113,8 +156,12 @@ class Task:
     
     # methods
     def start(self) -> None:
-        self._over = False
-        self._running = True
+        with self._cond:
+            self._cancelled = False
+            self._error = None
+            self._over = False
+            self._running = True
+            self._cond.notify_all()
         self._result.reset()
         for k in tuple(self._started_callbacks.keys()):
             self._started_callbacks[k]()
@@ -125,20 +172,20 @@ class Task:
             self._updated_callbacks[k](datum)
     
     def finish(self) -> None:
-        self._over = True
-        self._running = False
+        self._set_over()
         for k in tuple(self._finished_callbacks.keys()):
             self._finished_callbacks[k]()
     
     def cancel(self) -> None:
-        self._over = True
-        self._running = False
+        self._cancelled = True
+        self._set_over()
         for k in tuple(self._cancelled_callbacks.keys()):
             self._cancelled_callbacks[k]()
+        coro_mgr._wakeup(self.id)  # let it be recycled if it is sleeping.
     
     def crash(self, error: Exception) -> None:
-        self._over = True
-        self._running = False
+        self._error = error
+        self._set_over()
         if self._crashed_callbacks:
             for k in tuple(self._crashed_callbacks.keys()):
                 self._crashed_callbacks[k](error)
@@ -148,16 +195,20 @@ class Task:
     
     # -------------------------------------------------------------------------
     
-    def join(self, timeout: float = 60, interval: float = 10e-3) -> t.Any:
-        if self.over is None:
-            for _ in sync_wait(100e-3, 1e-3):
-                if self.over is not None:
-                    break
-            else:
-                raise Exception('task never starts')
-        for _ in sync_wait(timeout, interval):
-            if self.over:
-                break
+    def join(self, timeout: float = 60, interval: float = None) -> t.Any:
+        """
+        block until the task is over, and return its result.
+        
+        params:
+            timeout: raise TimeoutError if the task is not over in time. None
+                means waiting forever.
+            interval: not used, kept for compatibility.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._over, timeout):
+                if self._over is None:
+                    raise Exception('task never starts')
+                raise TimeoutError(timeout)
         return self.result
     
     def partial(self, *args, **kwargs) -> 'Task':
@@ -206,6 +257,15 @@ class Task:
             self.finish()
         # return self
     
+    def _set_over(self) -> None:
+        with self._cond:
+            self._over = True
+            self._running = False
+            waiters, self._waiters = self._waiters, []
+            self._cond.notify_all()
+        for callback in waiters:
+            callback()
+    
     def _finalize_arguments(self, *args, **kwargs) -> t.Tuple[tuple, dict]:
         if self._target_inst:
             final_args = (self._target_inst,) + self._partial_args + args
@@ -217,50 +277,140 @@ class Task:
             final_kwargs = kwargs
         return final_args, final_kwargs
     
+    def _add_waiter(self, callback: t.Callable[[], t.Any]) -> None:
+        """
+        call `callback` once when the task is over. if it is already over, call
+        it now.
+        """
+        with self._cond:
+            if not self._over:
+                self._waiters.append(callback)
+                return
+        callback()
+    
     def _rollup(self) -> t.Iterator:
         while self._rolls:
             bucket = self._rolls.popleft()
             yield from bucket
     
 
-class CoroutineManager:
-    _curr_task: t.Optional[Task]
-    _killed: bool
-    # _mainloop_task: asyncio.Task
-    _mainloop_thread: Thread
-    # _mainloop_thread: t.Coroutine
-    #   the main thread should be:
+class _TaskState:
+    """
+    scheduling settings and metrics of a task, owned by the manager.
+    """
+    
+    def __init__(self, priority: int = 0, affinity: int = None) -> None:
+        self.affinity = affinity
+        self.priority = priority
+        self.ready_since = 0.0
+        self.vruntime = 0.0
+        #   the run time weighted by priority. the ready task with the least
+        #   vruntime runs first.
+        # metrics
+        self.cpu_time = 0.0
+        self.overruns = 0
+        self.slices = 0
+        self.steps = 0
+        self.wait_time = 0.0
+
+
+class _Worker:
+    """
+    a thread of the coroutine manager, with its own ready queue and timer
+    heap. all workers share the lock of the manager.
+    """
+    
+    cond: Condition
+    min_vruntime: float  # vruntime of the latest picked task.
+    queued: t.Set[str]  # ids in `ready`.
+    ready: t.List[t.Tuple[float, int, str]]
+    #   a heap of (vruntime, seq, task_id).
+    sleeping: t.List[t.Tuple[float, int, str]]
+    #   a heap of (time_point, seq, task_id).
+    tasks: t.Set[str]  # ids of the running tasks assigned to this worker.
+    thread: t.Optional[Thread]
+    #   the thread should be:
     #       1. run at once
     #       2. interruptible by ctrl-c
     #       3. access class attributes
-    _running: bool
+    
+    def __init__(self, lock: Lock) -> None:
+        self.cond = Condition(lock)
+        self.min_vruntime = 0.0
+        self.queued = set()
+        self.ready = []
+        self.sleeping = []
+        self.tasks = set()
+        self.thread = None
+
+
+class CoroutineManager:
+    """
+    run generator tasks in background threads (workers). a worker is started
+    when the first task comes to it, and quits when all its tasks are done.
+    the ready task with the least vruntime (its run time divided by
+    `2 ** priority`) runs first, until it yields `pause` or uses up the slice
+    budget (see `set_slice`), so a busy task cannot starve the others.
+    the sleeping tasks wait in a heap keyed by wake time, and
+    the worker blocks on a condition until the next wake time or a new task
+    comes, so an idle manager costs nothing.
+    by default there is only one worker. use `set_workers` to run more, then
+    a slow step of one task only stalls the tasks on the same worker.
+    """
+    
+    _killed: bool
+    _local: local  # `_local.task` is the task being run in this worker.
+    _lock: Lock
+    #   guards the task states below and the queues of all workers.
+    _owners: t.Dict[str, _Worker]  # {task_id: worker, ...}
     _running_tasks: t.Dict[str, t.Tuple[Task, t.Iterator]]
+    _size: int  # the first `_size` workers accept new tasks.
+    _slice_steps: int
+    _slice_time: float
+    _states: t.Dict[str, _TaskState]
     _tasks: t.Dict[str, Task]
     _timer: t.Dict[str, float]  # {task_id: time_point, ...}
+    _workers: t.List[_Worker]
     
-    def __init__(self) -> None:
-        self._curr_task = None
+    def __init__(self, workers: int = 1) -> None:
         self._killed = False
-        self._running = False
+        self._local = local()
+        self._lock = Lock()
+        self._owners = {}
         self._running_tasks = {}
+        self._seq = count()
+        self._size = 0
+        self._slice_steps = 0
+        self._slice_time = 20e-3
+        self._states = {}
         self._tasks = {}
         self._timer = {}
-        
-        self._mainloop_thread = Thread(
-            target=asyncio.run, args=(self._mainloop(),), daemon=True
-        )
-        self._mainloop_thread.start()
+        self._workers = []
+        self.set_workers(workers)
     
     def __call__(
         self,
         name: str = None,
         singleton: bool = True,  # TODO
+        affinity: int = None,
+        priority: int = 0,
     ) -> t.Callable[[FunctionType], Task]:
+        """
+        params:
+            affinity: pin the task to the worker of this index (modulo the
+                count of workers). by default, a task goes to the least
+                loaded worker when it starts, and stays there until it is
+                over.
+            priority: when busy tasks share a worker, a task gets `2 **
+                priority` times the run time of a priority 0 task. can be
+                negative.
+        """
         def decorator(func: FunctionType) -> Task:
             nonlocal name
             if name is None:
                 name = _get_func_id(func)
             task = self._tasks[name] = Task(name, func, singleton)
+            self._states[name] = _TaskState(priority, affinity)
             return task
         
         return decorator
@@ -269,9 +419,25 @@ class CoroutineManager:
     def pause(self) -> _Pause:
         return pause
     
+    @property
+    def _curr_task(self) -> t.Optional[Task]:
+        return getattr(self._local, 'task', None)
+    
     def add_to_running_loop(self, task: Task, iterator: t.Iterator) -> None:
-        self._timer[task.id] = 0  # clear its timer
-        self._running_tasks[task.id] = (task, iterator)
+        with self._lock:
+            self._timer.pop(task.id, None)  # clear its timer
+            self._running_tasks[task.id] = (task, iterator)
+            if (worker := self._owners.get(task.id)) is None:
+                worker = self._owners[task.id] = self._pick_worker(task.id)
+                worker.tasks.add(task.id)
+            self._make_ready(worker, task.id)
+            if worker.thread is None:
+                worker.thread = Thread(
+                    target=self._mainloop, args=(worker,), daemon=True
+                )
+                worker.thread.start()
+            else:
+                worker.cond.notify()
     
     @staticmethod
     def cancel(task: Task) -> bool:
@@ -289,9 +455,34 @@ class CoroutineManager:
     def join(task: Task) -> t.Any:
         return task.join()
     
+    @staticmethod
+    def gather(*tasks: Task, timeout: float = None) -> t.List[t.Any]:
+        """
+        block until all tasks are over, and return their results in order.
+        each task notifies a shared counter when it is over, so the caller
+        sleeps until the last one finishes, no matter how many tasks.
+        in asyncio code, use `await asyncio.gather(*tasks)` instead.
+        """
+        cond = Condition(Lock())
+        pending = len(tasks)
+        
+        def countdown() -> None:
+            nonlocal pending
+            with cond:
+                pending -= 1
+                if not pending:
+                    cond.notify()
+        
+        for task in tasks:
+            task._add_waiter(countdown)
+        with cond:
+            if not cond.wait_for(lambda: not pending, timeout):
+                raise TimeoutError(
+                    '{} of {} tasks are not over'.format(pending, len(tasks))
+                )
+        return [x.result for x in tasks]
+    
     def join_all(self) -> None:
-        self._running = False
-        # print(self._running)
         """
         how to use `ctrl+c` to stop a thread?
             ref: https://stackoverflow.com/a/3788243/9695911
@@ -305,18 +496,48 @@ class CoroutineManager:
                     <thread>.join(<timeout>)
             when timeout reaches, it briefly releases the lock.
         """
-        while True:
-            self._mainloop_thread.join(10e-3)
-            if not self._mainloop_thread.is_alive():
-                break
+        # the workers quit when all tasks are done.
+        while threads := [x.thread for x in self._workers if x.thread]:
+            threads[0].join(10e-3)
         print(':tp', 'all tasks done')
     
     def kill(self, *args) -> None:
         print(':v7s', 'force kill', args)
-        self._killed = True
-        self._mainloop_thread.join()
+        with self._lock:
+            self._killed = True
+            for worker in self._workers:
+                worker.cond.notify()
+            threads = [x.thread for x in self._workers if x.thread]
+        for thread in threads:
+            thread.join()
         # raise SystemExit
     
+    def set_workers(self, workers: int) -> None:
+        """
+        run tasks in `workers` threads. the running tasks stay on their
+        current workers, the new ones are spread over the first `workers`
+        workers.
+        """
+        assert workers > 0
+        with self._lock:
+            while len(self._workers) < workers:
+                self._workers.append(_Worker(self._lock))
+            self._size = workers
+    
+    def set_slice(self, steps: int = 0, time: float = 20e-3) -> None:
+        """
+        the budget of a task each time it is picked. when it is used up, the
+        task is paused at its next yield, and other ready tasks run.
+        
+        params:
+            steps: max count of yields, 0 means no limit.
+            time: max seconds, 0 means no limit. a step cannot be interrupted,
+                a step longer than this is counted as an overrun.
+        """
+        with self._lock:
+            self._slice_steps = steps
+            self._slice_time = time
+    
     def sleep(self, sec: float) -> _Pause:
         """
         usage:
@@ -325,14 +546,46 @@ class CoroutineManager:
                 yield coro_mgr.sleep(1)
         """
         assert sec >= 1e-3, 'sleep time must be greater than 1ms'
-        assert self._curr_task is not None
-        assert not self._timer.get(self._curr_task.id)  # either 0 or None.
-        #   if assertion error, you may not yield `coro_mgr.sleep` in your
-        #   function.
-        after_time = time.time() + sec
-        self._timer[self._curr_task.id] = after_time
+        assert (task := self._curr_task) is not None
+        with self._lock:
+            assert not self._timer.get(task.id)  # either 0 or None.
+            #   if assertion error, you may not yield `coro_mgr.sleep` in
+            #   your function.
+            after_time = time.time() + sec
+            self._timer[task.id] = after_time
         return pause
     
+    def stats(self, task_id: str = None) -> t.Dict[str, dict]:
+        """
+        returns:
+            {task_id: {
+                'priority': int,
+                'slices': int, times the task is picked by its worker.
+                'steps': int, count of yields.
+                'cpu_time': float, cpu time of the steps, in seconds.
+                'wait_time': float, time of being ready but waiting for
+                    other tasks, in seconds.
+                'overruns': int, steps which take longer than the time
+                    slice, they block the other tasks of the worker.
+            }, ...}
+        """
+        with self._lock:
+            if task_id is None:
+                states = self._states.items()
+            else:
+                states = ((task_id, self._states[task_id]),)
+            return {
+                k: {
+                    'priority': v.priority,
+                    'slices': v.slices,
+                    'steps': v.steps,
+                    'cpu_time': v.cpu_time,
+                    'wait_time': v.wait_time,
+                    'overruns': v.overruns,
+                }
+                for k, v in states
+            }
+    
     def wait(
         self, timeout: float, interval: float, timeout_error: bool = True
     ) -> t.Iterator:
@@ -413,53 +666,115 @@ class CoroutineManager:
     # fmt:on
     # -------------------------------------------------------------------------
     
-    async def _mainloop(self) -> None:
-        # print(':dv')
-        finished_ids = []
-        
-        self._running = True
+    def _mainloop(self, worker: _Worker) -> None:
         while True:
-            if self._killed:
-                break
-            if not self._running_tasks:
-                if self._running:
-                    await asyncio.sleep(1e-3)
-                    # await asyncio.sleep(10e-3)
+            with worker.cond:
+                while True:
+                    if self._killed or not worker.tasks:
+                        worker.thread = None
+                        return
+                    now = time.time()
+                    while worker.sleeping and worker.sleeping[0][0] <= now:
+                        time_point, _, id = heappop(worker.sleeping)
+                        # the entry is stale if the task is waked up or
+                        # restarted before.
+                        if self._timer.get(id) == time_point:
+                            del self._timer[id]
+                            self._make_ready(worker, id)
+                    if worker.ready:
+                        break
+                    worker.cond.wait(
+                        worker.sleeping[0][0] - now
+                        if worker.sleeping else None
+                    )
+                vruntime, _, id = heappop(worker.ready)
+                worker.queued.discard(id)
+                if id not in self._running_tasks:
                     continue
-                else:
-                    break
-            
-            finished_ids.clear()
-            self._curr_task = None
+                task, iter = self._running_tasks[id]
+                state = self._states[id]
+                state.wait_time += time.perf_counter() - state.ready_since
+                worker.min_vruntime = max(worker.min_vruntime, vruntime)
+                max_steps, max_time = self._slice_steps, self._slice_time
             
-            for id, (task, iter) in self._running_tasks.items():
-                # print(id, task, task.done, iter, id in self._timer, ':lv')
-                if task.over:
-                    finished_ids.append(id)
-                    continue
-                
-                if s := self._timer.get(id):
-                    await asyncio.sleep(1e-3)
-                    # await asyncio.sleep(1)  # TEST
-                    if time.time() < s:
-                        continue
-                    del self._timer[id]
-                
-                self._curr_task = task
+            over = task.over
+            overruns = steps = 0
+            start = last = time.perf_counter()
+            cpu_start = time.thread_time()
+            if not over:
+                self._local.task = task
                 try:
                     for x in iter:
-                        if x is pause:
-                            break
-                        else:
+                        if x is not pause:
                             task.update(x)
+                        steps += 1
+                        now = time.perf_counter()
+                        if max_time and now - last > max_time:
+                            overruns += 1
+                        last = now
+                        if (
+                            x is pause or
+                            steps == max_steps or
+                            (max_time and now - start >= max_time)
+                        ):
+                            break
                     else:
                         task.finish()
+                        over = True
                 except Exception as e:
                     task.crash(e)
-                    finished_ids.append(id)
+                    over = True
+                self._local.task = None
             
-            for id in finished_ids:
-                del self._running_tasks[id]
+            with worker.cond:
+                state.cpu_time += time.thread_time() - cpu_start
+                state.overruns += overruns
+                state.slices += 1
+                state.steps += steps
+                state.vruntime = vruntime + (
+                    (time.perf_counter() - start) / 2 ** state.priority
+                )
+                if self._running_tasks.get(id, (None, None))[1] is not iter:
+                    pass  # restarted by another call.
+                elif over:
+                    del self._owners[id]
+                    del self._running_tasks[id]
+                    self._timer.pop(id, None)
+                    worker.tasks.discard(id)
+                elif time_point := self._timer.get(id):
+                    heappush(
+                        worker.sleeping, (time_point, next(self._seq), id)
+                    )
+                else:
+                    self._make_ready(worker, id)
+    
+    def _make_ready(self, worker: _Worker, task_id: str) -> None:
+        """
+        put the task in the ready heap of its worker. must be called with the
+        lock held.
+        """
+        if task_id in worker.queued:
+            return
+        state = self._states.setdefault(task_id, _TaskState())
+        # a task which has slept (or is new) does not get credit for the time
+        # it was away, otherwise it would hog the worker after waking up.
+        state.vruntime = max(state.vruntime, worker.min_vruntime)
+        state.ready_since = time.perf_counter()
+        worker.queued.add(task_id)
+        heappush(worker.ready, (state.vruntime, next(self._seq), task_id))
+    
+    def _pick_worker(self, task_id: str) -> _Worker:
+        state = self._states.get(task_id)
+        if state and state.affinity is not None:
+            return self._workers[state.affinity % self._size]
+        return min(self._workers[:self._size], key=lambda x: len(x.tasks))
+    
+    def _wakeup(self, task_id: str) -> None:
+        with self._lock:
+            if (worker := self._owners.get(task_id)) is not None:
+                self._timer.pop(task_id, None)
+                self._make_ready(worker, task_id)
+                worker.cond.notify()
 
 
 def _get_func_id(func: FunctionType) -> str:
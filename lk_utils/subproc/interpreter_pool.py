@@ -0,0 +1,162 @@
+import json
+import os
+import subprocess as sp
+import sys
+import typing as t
+from collections import deque
+from threading import Lock
+
+from .subprocess import Popen
+from .subprocess import _wait_output
+
+# the worker runs this code by `python -c`. note we cannot run a file inside
+# this package as the entry, since "lk_utils/subproc" would be inserted to
+# `sys.path[0]`, then our "subprocess.py" and "threading.py" shadow the
+# standard libraries.
+_BOOTSTRAP = '''
+import json, os, runpy, sys
+for name in sys.argv[1:]:
+    try:
+        __import__(name)
+    except Exception:
+        pass
+line = sys.stdin.readline()
+if not line:
+    sys.exit(0)
+job = json.loads(line)
+os.chdir(job['cwd'])
+os.environ.clear()
+os.environ.update(job['env'])
+sys.argv = [job['target'], *job['argv']]
+if job['module']:
+    sys.path[0] = os.getcwd()
+    runpy.run_module(job['target'], run_name='__main__', alter_sys=True)
+else:
+    sys.path[0] = os.path.dirname(os.path.abspath(job['target']))
+    runpy.run_path(job['target'], run_name='__main__')
+'''
+
+
+class InterpreterPool:
+    """
+    a pool of pre-started python interpreters, each has imported `preload`
+    modules and waits for a job.
+    every interpreter runs exactly one job and then exits, so jobs never see
+    the leftovers (modules, globals, patched states) of each other. the pool
+    is refilled right after each job.
+
+    usage:
+        pool = InterpreterPool(size=2, preload=('yaml', 'rich'))
+        output = pool.run('scripts/foo.py', '--bar', 'baz')
+        output = pool.run('http.server', '8080', module=True, verbose=True)
+    """
+
+    _idle: t.Deque[Popen]
+
+    def __init__(
+        self,
+        size: int = 2,
+        preload: t.Sequence[str] = (),
+        python: str = sys.executable,
+    ) -> None:
+        self.preload = tuple(preload)
+        self.python = python
+        self.size = size
+        self._closed = False
+        self._idle = deque()
+        self._lock = Lock()
+        self._fill()
+
+    def __enter__(self) -> 'InterpreterPool':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                worker = self._idle.popleft()
+                worker.stdin.close()  # the worker exits on empty input.
+
+    def run(
+        self,
+        target: str,
+        *argv: t.Any,
+        module: bool = False,
+        cwd: t.Optional[str] = None,
+        env: t.Optional[t.Dict[str, str]] = None,
+        verbose: bool = False,
+        ignore_error: bool = False,
+        ignore_return: bool = False,
+        force_term_color: bool = False,
+    ) -> t.Optional[str]:
+        """
+        run a script (or a module if `module` is true) in a warm interpreter,
+        like `run_cmd_args(sys.executable, target, *argv)` (or `... '-m',
+        target, ...`) does.
+        the job runs in the caller's current working directory (or `cwd`)
+        and environment, not the ones when the worker was started. but the
+        `preload` modules have been imported with the old ones.
+        unlike `run_cmd_args`, the job's stdin is closed, it cannot read
+        from the console.
+        the other params have the same meaning as in `run_cmd_args`.
+
+        params:
+            env: extra environment variables, they are added to the caller's
+                environment for the job.
+        """
+        argv = tuple(map(str, argv))
+        args = (self.python, *(('-m',) if module else ()), target, *argv)
+        if verbose:
+            print('[magenta dim]{}[/]'.format(' '.join(args)), ':psr')
+
+        worker = self._acquire()
+        job = {
+            'argv': argv,
+            'cwd': os.path.abspath(cwd or os.getcwd()),
+            'env': {**os.environ, **(env or {})},
+            'module': module,
+            'target': target,
+        }
+        if force_term_color:
+            job['env']['LK_LOGGER_FORCE_COLOR'] = '1'
+        worker.stdin.write(json.dumps(job).encode() + b'\n')
+        worker.stdin.close()
+        try:
+            return _wait_output(
+                worker,
+                args,
+                verbose,
+                force_term_color,
+                ignore_error,
+                ignore_return,
+            )
+        finally:
+            # refill after the job, so that the starting interpreter does not
+            # compete with the job for cpu.
+            self._fill()
+
+    def _acquire(self) -> Popen:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.popleft()
+                if worker.poll() is None:
+                    return worker
+        print(':v6', 'no warm interpreter available, start a cold one.')
+        return self._spawn()
+
+    def _fill(self) -> None:
+        with self._lock:
+            while not self._closed and len(self._idle) < self.size:
+                self._idle.append(self._spawn())
+
+    def _spawn(self) -> Popen:
+        return Popen(
+            (self.python, '-u', '-c', _BOOTSTRAP, *self.preload),
+            stdin=sp.PIPE,
+            stdout=sp.PIPE,
+            stderr=sp.STDOUT,
+            text=False,
+        )
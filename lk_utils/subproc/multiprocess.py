@@ -1,17 +1,54 @@
+import atexit
+import importlib
+import multiprocessing as mp
+import os
 import typing as t
+from array import array
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
 from functools import wraps
 from multiprocessing import Process
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock
 from types import FunctionType
 
 
 class T:
     Target = FunctionType
-    Wrapper = t.Callable[[...], Process]
+    Wrapper = t.Callable[[...], t.Union[Process, Future]]
     Decorator = t.Callable[[Target], Wrapper]
+    StartMethod = t.Literal['fork', 'forkserver', 'spawn']
 
 
-def new_process(daemon: bool = True) -> T.Decorator:
+def new_process(
+    daemon: bool = True, pool: t.Union[bool, 'ProcessPool'] = False
+) -> T.Decorator:
+    """
+    params:
+        pool: if false, each call starts a bare `multiprocessing.Process`,
+            which gives no result back.
+            if true (use the shared `process_pool`) or a `ProcessPool`
+            instance, each call is submitted to the pool, and returns a
+            `concurrent.futures.Future` of the result. `daemon` is ignored in
+            this case.
+            note the decorated function must be defined at module level, so
+            that the pool workers can import it.
+    """
+    if pool is True:
+        pool = process_pool
+    
     def decorator(func: T.Target) -> T.Wrapper:
+        if pool:
+            @wraps(func)
+            def wrapper(*args, **kwargs) -> Future:
+                return pool.submit(func, *args, **kwargs)
+            
+            # the name of `func` in its module is now bound to `wrapper`, so
+            # `func` cannot be pickled by reference. we tell the workers to
+            # find it by name and unwrap it.
+            wrapper._lk_process_pool_target = True
+            return wrapper
+        
         @wraps(func)
         def wrapper(*args, **kwargs) -> Process:
             p = Process(target=func, args=args, kwargs=kwargs, daemon=daemon)
@@ -21,3 +58,231 @@ def new_process(daemon: bool = True) -> T.Decorator:
         return wrapper
     
     return decorator
+
+
+class ProcessPool:
+    """
+    a process pool which returns futures of results, built on
+    `concurrent.futures.ProcessPoolExecutor`. the workers are started lazily
+    on the first submission.
+    
+    large `bytes`, `bytearray`, `memoryview`, `array.array` and
+    `numpy.ndarray` arguments and results (top level only) are passed through
+    `multiprocessing.shared_memory` instead of being pickled through pipes.
+    
+    usage:
+        pool = ProcessPool(max_workers=4, start_method='spawn')
+        future = pool.submit(hashlib.sha256, data)
+        print(future.result())
+    """
+    
+    def __init__(
+        self,
+        max_workers: t.Optional[int] = None,
+        start_method: t.Optional[T.StartMethod] = None,
+        shm_threshold: int = 1024 * 1024,
+    ) -> None:
+        """
+        params:
+            max_workers: defaults to `os.cpu_count()`.
+            start_method: defaults to the platform's default.
+            shm_threshold: the min size in bytes of an argument or result to
+                go through shared memory.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.shm_threshold = shm_threshold
+        self.start_method = start_method
+        self._executor: t.Optional[ProcessPoolExecutor] = None
+        self._lock = Lock()
+    
+    def __enter__(self) -> 'ProcessPool':
+        return self
+    
+    def __exit__(self, *_) -> None:
+        self.shutdown()
+    
+    def submit(self, func: t.Callable, *args, **kwargs) -> Future:
+        blocks: t.List[SharedMemory] = []
+        try:
+            args = tuple(_dump(x, self.shm_threshold, blocks) for x in args)
+            kwargs = {
+                k: _dump(v, self.shm_threshold, blocks)
+                for k, v in kwargs.items()
+            }
+            inner = self._get_executor().submit(
+                _call, _reference(func), args, kwargs, self.shm_threshold
+            )
+        except BaseException:
+            _release(blocks)
+            raise
+        
+        outer = Future()
+        
+        def on_inner_done(inner: Future) -> None:
+            _release(blocks)
+            if inner.cancelled():
+                outer.cancel()
+                return
+            if e := inner.exception():
+                if outer.set_running_or_notify_cancel():
+                    outer.set_exception(e)
+                return
+            result = _load(inner.result(), unlink=True)
+            if outer.set_running_or_notify_cancel():
+                outer.set_result(result)
+        
+        def on_outer_done(outer: Future) -> None:
+            if outer.cancelled():
+                inner.cancel()
+        
+        outer.add_done_callback(on_outer_done)
+        inner.add_done_callback(on_inner_done)
+        return outer
+    
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        with self._lock:
+            if self._executor:
+                self._executor.shutdown(wait, cancel_futures=cancel_futures)
+                self._executor = None
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers,
+                    mp_context=mp.get_context(self.start_method),
+                )
+            return self._executor
+
+
+class _Reference(t.NamedTuple):
+    module: str
+    qualname: str
+
+
+class _Shared(t.NamedTuple):
+    name: str
+    size: int
+    kind: str  # 'bytes', 'bytearray', 'array' or 'ndarray'
+    meta: tuple = ()  # typecode of array, or (dtype, shape) of ndarray.
+
+
+def _attach(name: str, track: bool) -> SharedMemory:
+    try:
+        return SharedMemory(name, track=track)
+    except TypeError:  # python < 3.13
+        return SharedMemory(name)
+
+
+def _call(
+    func: t.Union[t.Callable, _Reference],
+    args: tuple,
+    kwargs: dict,
+    shm_threshold: int,
+) -> t.Any:
+    """run in worker process."""
+    if isinstance(func, _Reference):
+        obj = importlib.import_module(func.module)
+        for name in func.qualname.split('.'):
+            obj = getattr(obj, name)
+        func = obj.__wrapped__
+    args = tuple(_load(x) for x in args)
+    kwargs = {k: _load(v) for k, v in kwargs.items()}
+    return _dump(func(*args, **kwargs), shm_threshold)
+
+
+def _dump(
+    obj: t.Any,
+    threshold: int,
+    blocks: t.Optional[t.List[SharedMemory]] = None,
+) -> t.Any:
+    """
+    move a large buffer into shared memory and return its handle. otherwise
+    return the object as is.
+    if `blocks` is given, the created block is added to it for the caller to
+    unlink later. if not (in worker), the block is closed here and unlinked
+    by the receiver.
+    """
+    meta = ()
+    if isinstance(obj, (bytes, bytearray)):
+        kind = type(obj).__name__
+        view = memoryview(obj)
+    elif isinstance(obj, memoryview):
+        kind = 'bytes'
+        view = obj.cast('B') if obj.c_contiguous else memoryview(obj.tobytes())
+    elif isinstance(obj, array):
+        kind = 'array'
+        meta = (obj.typecode,)
+        view = memoryview(obj).cast('B')
+    elif type(obj).__module__ == 'numpy' and type(obj).__name__ == 'ndarray':
+        import numpy
+        kind = 'ndarray'
+        meta = (obj.dtype.str, obj.shape)
+        view = memoryview(numpy.ascontiguousarray(obj)).cast('B')
+    else:
+        return obj
+    if view.nbytes < threshold or view.nbytes == 0:
+        return obj
+    shm = SharedMemory(create=True, size=view.nbytes)
+    shm.buf[:view.nbytes] = view
+    if blocks is None:
+        shm.close()
+    else:
+        blocks.append(shm)
+    return _Shared(shm.name, view.nbytes, kind, meta)
+
+
+def _load(obj: t.Any, unlink: bool = False) -> t.Any:
+    """
+    the reverse of `_dump`. the data is copied out, so the block can be
+    released right after.
+    """
+    if not isinstance(obj, _Shared):
+        return obj
+    shm = _attach(obj.name, track=unlink)
+    try:
+        with shm.buf[:obj.size] as data:
+            if obj.kind == 'bytes':
+                out = bytes(data)
+            elif obj.kind == 'bytearray':
+                out = bytearray(data)
+            elif obj.kind == 'array':
+                out = array(obj.meta[0])
+                out.frombytes(data)
+            else:
+                import numpy
+                dtype, shape = obj.meta
+                out = numpy.frombuffer(data, dtype).reshape(shape).copy()
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+    return out
+
+
+def _reference(func: t.Callable) -> t.Union[t.Callable, _Reference]:
+    if getattr(func, '_lk_process_pool_target', False):
+        return _Reference(func.__module__, func.__qualname__)
+    if (module := getattr(func, '__module__', None)) is None:
+        return func  # e.g. a bound builtin method.
+    try:
+        obj = importlib.import_module(module)
+        for name in func.__qualname__.split('.'):
+            obj = getattr(obj, name)
+    except Exception:
+        return func  # let pickle report the error.
+    if obj is not func and getattr(obj, '__wrapped__', None) is func:
+        # `func` is decorated by `new_process(pool=...)` in its module.
+        return _Reference(func.__module__, func.__qualname__)
+    return func
+
+
+def _release(blocks: t.List[SharedMemory]) -> None:
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+    blocks.clear()
+
+
+process_pool = ProcessPool()
+atexit.register(process_pool.shutdown, wait=False, cancel_futures=True)
@@ -0,0 +1,92 @@
+import os
+import typing as t
+from concurrent.futures import Future
+from concurrent.futures import as_completed
+
+from .multiprocess import ProcessPool
+from .multiprocess import process_pool
+from .threading import WorkerPool
+from ..chunk import chunkwise
+
+
+class T:
+    Backend = t.Literal['thread', 'process']
+    Func = t.Callable[[t.Any], t.Any]
+
+
+def parallel_map(
+    func: T.Func,
+    iterable: t.Iterable,
+    workers: t.Optional[int] = None,
+    backend: T.Backend = 'thread',
+    chunk_size: t.Optional[int] = None,
+) -> t.List[t.Any]:
+    """
+    like `list(map(func, iterable))`, but runs in parallel. the results are in
+    the same order as the input.
+
+    params:
+        workers: defaults to `os.cpu_count()`.
+        backend:
+            'thread': for io bound tasks, or tasks which release the gil.
+            'process': for cpu bound tasks. `func` must be picklable, i.e.
+                defined at module level. the shared `process_pool` is used
+                if `workers` is not given.
+        chunk_size: how many items are sent to a worker at once. if not
+            given, it is chosen to make about 4 chunks per worker.
+
+    if any call raises, the exception is raised here and the pending chunks
+    are cancelled.
+    """
+    return list(parallel_imap(func, iterable, workers, backend, chunk_size))
+
+
+def parallel_imap(
+    func: T.Func,
+    iterable: t.Iterable,
+    workers: t.Optional[int] = None,
+    backend: T.Backend = 'thread',
+    chunk_size: t.Optional[int] = None,
+    ordered: bool = True,
+) -> t.Iterator[t.Any]:
+    """
+    the lazy version of `parallel_map`. results are yielded as soon as their
+    chunk is done.
+
+    params:
+        ordered: if false, chunks are yielded in the order they finish,
+            which avoids waiting for a slow chunk at the head.
+        for other params see `parallel_map`.
+
+    note: the whole iterable is read at once before any task starts.
+    """
+    items = iterable if isinstance(iterable, t.Sequence) else tuple(iterable)
+    if backend == 'thread':
+        pool = WorkerPool(workers or os.cpu_count() or 1)
+    elif backend == 'process':
+        pool = ProcessPool(workers) if workers else process_pool
+    else:
+        raise ValueError('unknown backend: {}'.format(backend))
+    if not items:
+        return
+    if chunk_size is None:
+        chunk_size, extra = divmod(len(items), pool.max_workers * 4)
+        if extra or not chunk_size:
+            chunk_size += 1
+
+    futures: t.List[Future] = []
+    try:
+        for indexes in chunkwise(range(len(items)), chunk_size, 0, False):
+            chunk = tuple(items[i] for i in indexes if i is not None)
+            futures.append(pool.submit(_run_chunk, func, chunk))
+        for future in futures if ordered else as_completed(futures):
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        if pool is not process_pool:
+            pool.shutdown(wait=False)
+
+
+def _run_chunk(func: T.Func, chunk: tuple) -> t.List[t.Any]:
+    return [func(x) for x in chunk]
@@ -0,0 +1,242 @@
+import sys
+import typing as t
+from collections import deque
+from concurrent.futures import CancelledError
+from threading import Condition
+from threading import Event
+from threading import Lock
+from types import GeneratorType
+
+from .multiprocess import ProcessPool
+from .threading import new_thread
+
+
+class T:
+    Backend = t.Literal['thread', 'process']
+    StageFunc = t.Callable[[t.Any], t.Union[t.Any, t.Iterator[t.Any]]]
+
+
+class Stage:
+    def __init__(
+        self, func: T.StageFunc, workers: int = 1, backend: T.Backend = 'thread'
+    ) -> None:
+        assert workers > 0
+        assert backend in ('thread', 'process')
+        self.backend = backend
+        self.func = func
+        self.workers = workers
+        self._pool: t.Optional[ProcessPool] = None
+
+    def open(self) -> None:
+        if self.backend == 'process':
+            self._pool = ProcessPool(self.workers)
+
+    def close(self) -> None:
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def process(self, item: t.Any) -> t.Iterator[t.Any]:
+        if self._pool:
+            yield from self._pool.submit(_call, self.func, item).result()
+            return
+        result = self.func(item)
+        if isinstance(result, GeneratorType):
+            yield from result
+        else:
+            yield result
+
+
+class Pipeline:
+    """
+    chain stages by bounded queues. each stage runs on its own workers, so
+    io and cpu work of different stages overlap, and the memory is bounded by
+    `maxsize` items per queue.
+
+    a stage is a function which takes one item, and either returns one
+    output, or is a generator yielding any number of outputs (a generator in
+    a process stage is collected into a list in the worker before sent
+    back).
+    if any stage raises, the whole pipeline is cancelled and the error is
+    raised to the consumer.
+
+    usage:
+        pipe = (
+            Pipeline(maxsize=64)
+            .add(read_lines)
+            .add(parse, workers=4, backend='process')
+            .add(write)
+        )
+        pipe.run(paths)
+        # or consume the outputs of the last stage lazily:
+        for x in pipe.stream(paths):
+            ...
+    """
+
+    def __init__(self, maxsize: int = 16) -> None:
+        self.maxsize = maxsize
+        self._cancel: t.Optional[t.Callable[[], None]] = None
+        self._stages: t.List[Stage] = []
+
+    def add(
+        self, func: T.StageFunc, workers: int = 1, backend: T.Backend = 'thread'
+    ) -> 'Pipeline':
+        """
+        params:
+            workers: count of threads (or processes) of this stage. note if
+                it is more than 1, the order of outputs is not kept.
+            backend: 'process' for cpu bound stages, the func must be
+                picklable (defined at module level).
+        """
+        self._stages.append(Stage(func, workers, backend))
+        return self
+
+    def cancel(self) -> None:
+        if self._cancel:
+            self._cancel()
+
+    def run(self, source: t.Iterable) -> t.List[t.Any]:
+        return list(self.stream(source))
+
+    def stream(self, source: t.Iterable) -> t.Iterator[t.Any]:
+        assert self._stages, 'pipeline has no stage'
+        assert not self._cancel, 'pipeline is already running'
+        stages = self._stages
+        cancelled = Event()
+        errors: t.List[BaseException] = []
+        lock = Lock()
+        queues = [_Queue(self.maxsize) for _ in range(len(stages) + 1)]
+        remaining = [s.workers for s in stages]
+
+        def cancel() -> None:
+            cancelled.set()
+            for q in queues:
+                q.cancel()
+
+        def fail(e: BaseException) -> None:
+            with lock:
+                errors.append(e)
+            cancel()
+
+        @new_thread(group='lk_utils')
+        def feed() -> None:
+            try:
+                for item in source:
+                    if not queues[0].put(item):
+                        return
+            except Exception as e:
+                fail(e)
+                return
+            for _ in range(stages[0].workers):
+                queues[0].put(_END)
+
+        @new_thread(group='lk_utils')
+        def work(index: int) -> None:
+            stage = stages[index]
+            src, dst = queues[index], queues[index + 1]
+            try:
+                while (item := src.get()) is not _END:
+                    for out in stage.process(item):
+                        if not dst.put(out):
+                            return
+            except Exception as e:
+                fail(e)
+                return
+            with lock:
+                remaining[index] -= 1
+                if remaining[index]:
+                    return
+            # the last worker of this stage tells the next stage to end.
+            if index + 1 < len(stages):
+                count = stages[index + 1].workers
+            else:
+                count = 1  # the consumer.
+            for _ in range(count):
+                dst.put(_END)
+
+        self._cancel = cancel
+        for stage in stages:
+            stage.open()
+        threads = [
+            work(i)
+            for i, stage in enumerate(stages)
+            for _ in range(stage.workers)
+        ]
+        # the feeder is not joined at the end, since it may be blocked by the
+        # source (e.g. reading from a socket). it quits on its next `put`.
+        feed()
+
+        try:
+            while (item := queues[-1].get()) is not _END:
+                yield item
+            if errors:
+                raise errors[0]
+            if cancelled.is_set():
+                raise CancelledError('pipeline is cancelled')
+        finally:
+            cancel()  # stop the workers if the consumer quits early.
+            for th in threads:
+                th.join()
+            for stage in stages:
+                stage.close()
+            self._cancel = None
+
+
+class _Queue:
+    """
+    a bounded queue whose blocked `get` and `put` can be waked up by
+    `cancel`. after it is cancelled, `get` returns `_END` and `put` returns
+    False.
+    """
+
+    def __init__(self, maxsize: int = 0) -> None:
+        self.maxsize = maxsize
+        self._cancelled = False
+        self._items = deque()
+        self._lock = Lock()
+        self._not_empty = Condition(self._lock)
+        self._not_full = Condition(self._lock)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            self._items.clear()
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def get(self) -> t.Any:
+        with self._lock:
+            while not self._items and not self._cancelled:
+                self._not_empty.wait(_WAKEUP)
+            if self._cancelled:
+                return _END
+            item = self._items.popleft()
+            self._not_full.notify()
+            return item
+
+    def put(self, item: t.Any) -> bool:
+        with self._lock:
+            while (
+                self.maxsize and len(self._items) >= self.maxsize
+                and not self._cancelled
+            ):
+                self._not_full.wait(_WAKEUP)
+            if self._cancelled:
+                return False
+            self._items.append(item)
+            self._not_empty.notify()
+            return True
+
+
+def _call(func: T.StageFunc, item: t.Any) -> t.List[t.Any]:
+    """run in worker process."""
+    result = func(item)
+    if isinstance(result, GeneratorType):
+        return list(result)
+    return [result]
+
+
+_END = object()
+# on windows, a blocking wait cannot be interrupted by ctrl+c, so wake up
+# periodically there.
+_WAKEUP = 1 if sys.platform == 'win32' else None
@@ -1,6 +1,15 @@
 import typing as t
+from concurrent.futures import Future
+from concurrent.futures import InvalidStateError
+from threading import Lock
 
 from .threading import Thread as Thread
+from .threading import _wait_future
+
+
+class T:
+    Executor = t.Any  # any object has `submit(func, *args, **kwargs)`, e.g.
+    #   `concurrent.futures.ThreadPoolExecutor`, `WorkerPool`, `ProcessPool`.
 
 
 def defer(func: t.Callable, *args, **kwargs) -> 'Promise':
@@ -10,6 +19,10 @@ def defer(func: t.Callable, *args, **kwargs) -> 'Promise':
             self used keys:
                 __instant_starting__: bool, default True.
                 __daemon__: bool, default True.
+                __executor__: optional executor, see `T.Executor`. if given,
+                    the func is submitted to it instead of running in a new
+                    thread, so a large fan-out does not need a thread for
+                    each call.
             other keys will be passed to `func`.
 
     usage:
@@ -21,6 +34,15 @@ def defer(func: t.Callable, *args, **kwargs) -> 'Promise':
     """
     start_now = kwargs.pop('__instant_starting__', True)
     daemon = kwargs.pop('__daemon__', True)
+    executor = kwargs.pop('__executor__', None)
+    if executor is not None:
+        promise = Promise()
+        promise._starter = lambda: promise.follow(
+            executor.submit(func, *args, **kwargs)
+        )
+        if start_now:
+            promise.start()
+        return promise
     t = Thread(
         func, args=args, kwargs=kwargs,
         daemon=daemon, start_now=start_now
@@ -29,43 +51,204 @@ def defer(func: t.Callable, *args, **kwargs) -> 'Promise':
 
 
 class Promise:
-    _is_done: bool
-    _thread: Thread
-    _then: t.Optional[t.Callable]
-    _result: t.Any
+    """
+    a promise is settled by a thread, an executor (see `defer`), or manually
+    by `resolve` and `reject`. it is backed by a `concurrent.futures.Future`,
+    no thread is created for the waiting and the callbacks.
     
-    def __init__(self, thread: Thread):
-        self._is_done = False
+    usage:
+        p = Promise()
+        p.then(print)
+        p.resolve(123)  # it prints 123
+    """
+    
+    _future: Future
+    _source: t.Optional['Promise']  # the promise which `then` is called on.
+    _starter: t.Optional[t.Callable[[], t.Any]]
+    _thread: t.Optional[Thread]
+    
+    def __init__(self, thread: t.Optional[Thread] = None):
+        self._future = thread.future if thread else Future()
+        self._source = None
+        self._starter = None
         self._thread = thread
-        self._then = None
-        self._result = None
     
     def __call__(self) -> t.Any:
         return self.fulfill()
     
-    def start(self) -> None:
-        self._thread.start()
+    @property
+    def future(self) -> Future:
+        return self._future
     
-    def then(self, func, args: tuple = None, kwargs: dict = None) -> t.Self:
-        from functools import partial
-        self._then = partial(func, args or (), kwargs or {})
-        return self
+    @property
+    def is_done(self) -> bool:
+        return self._future.done()
+    
+    @property
+    def is_started(self) -> bool:
+        if self._thread:
+            return self._thread._is_executed
+        if self._source:
+            return self._source.is_started
+        return self._starter is None
+    
+    def start(self) -> None:
+        if self._thread:
+            self._thread.start()
+        elif self._source:
+            self._source.start()
+        elif self._starter:
+            starter, self._starter = self._starter, None
+            starter()
     
-    def fetch(self) -> t.Optional[t.Any]:
-        if self._is_done:
-            return self._result
+    def then(
+        self, func: t.Callable, args: tuple = None, kwargs: dict = None
+    ) -> 'Promise':
+        """
+        returns a new promise, which is resolved with
+        `func(result, *args, **kwargs)` after this promise is resolved, or
+        rejected with the same exception if this promise is rejected.
+        a promise can have many `then` callbacks, each of them gets the result
+        of this promise; to pass the result along, chain them:
+        `p.then(f1).then(f2)`.
+        the callback runs in the thread which settles this promise, or in the
+        current thread if this promise is already settled.
+        """
+        out = Promise()
+        out._source = self
         
-        self._result = self._thread.join()
-        del self._thread
-        self._is_done = True
+        def callback(future: Future) -> None:
+            if future.cancelled():
+                out._future.cancel()
+            elif e := future.exception():
+                out.reject(e)
+            else:
+                try:
+                    out.resolve(
+                        func(future.result(), *(args or ()), **(kwargs or {}))
+                    )
+                except Exception as e:
+                    out.reject(e)
         
-        if self._then:
-            self._result = self._then(self._result)
-        return self._result
+        self._future.add_done_callback(callback)
+        return out
+    
+    def resolve(self, result: t.Any = None) -> bool:
+        """returns false if the promise is already settled."""
+        try:
+            self._future.set_result(result)
+        except InvalidStateError:
+            return False
+        return True
+    
+    def reject(self, exception: BaseException) -> bool:
+        """returns false if the promise is already settled."""
+        try:
+            self._future.set_exception(exception)
+        except InvalidStateError:
+            return False
+        return True
+    
+    def follow(self, future: Future) -> 'Promise':
+        """settle this promise by another future, returns self."""
+        def callback(future: Future) -> None:
+            if future.cancelled():
+                self._future.cancel()
+            elif e := future.exception():
+                self.reject(e)
+            else:
+                self.resolve(future.result())
+        
+        future.add_done_callback(callback)
+        return self
+    
+    def fetch(self, timeout: t.Optional[float] = None) -> t.Optional[t.Any]:
+        """
+        wait for the result. if the promise is rejected, the exception is
+        raised.
+        """
+        if not self._future.done():
+            if not self.is_started:
+                raise Exception('promise is never started!')
+            _wait_future(self._future, timeout)
+        return self._future.result(timeout=0)
     
     # alias
     fulfill = join = fetch
     
-    @property
-    def is_done(self) -> bool:
-        return self._is_done
+    # -------------------------------------------------------------------------
+    # combinators
+    
+    @staticmethod
+    def all(*promises: 'Promise') -> 'Promise':
+        """
+        resolved with the list of results (in order) when all promises are
+        resolved, or rejected by the first rejection.
+        """
+        out = Promise()
+        results = [None] * len(promises)
+        pending = len(promises)
+        lock = Lock()
+        if not promises:
+            out.resolve([])
+            return out
+        
+        def on_done(index: int, future: Future) -> None:
+            nonlocal pending
+            if e := _exception(future):
+                out.reject(e)
+                return
+            with lock:
+                results[index] = future.result()
+                pending -= 1
+                if pending:
+                    return
+            out.resolve(results)
+        
+        for i, p in enumerate(promises):
+            p._future.add_done_callback(lambda f, i=i: on_done(i, f))
+        return out
+    
+    @staticmethod
+    def any(*promises: 'Promise') -> 'Promise':
+        """
+        resolved with the result of the first resolved promise, or rejected
+        when all promises are rejected.
+        """
+        out = Promise()
+        errors = [None] * len(promises)
+        pending = len(promises)
+        lock = Lock()
+        if not promises:
+            out.reject(Exception('no promise to wait for'))
+            return out
+        
+        def on_done(index: int, future: Future) -> None:
+            nonlocal pending
+            if not (e := _exception(future)):
+                out.resolve(future.result())
+                return
+            with lock:
+                errors[index] = e
+                pending -= 1
+                if pending:
+                    return
+            out.reject(Exception('all promises are rejected', errors))
+        
+        for i, p in enumerate(promises):
+            p._future.add_done_callback(lambda f, i=i: on_done(i, f))
+        return out
+    
+    @staticmethod
+    def race(*promises: 'Promise') -> 'Promise':
+        """settled the same way as the first settled promise."""
+        out = Promise()
+        for p in promises:
+            out.follow(p._future)
+        return out
+
+
+def _exception(future: Future) -> t.Optional[BaseException]:
+    if future.cancelled():
+        return Exception('promise is cancelled')
+    return future.exception()
@@ -0,0 +1,115 @@
+import typing as t
+from dataclasses import dataclass
+from threading import Lock
+from time import time
+
+import psutil
+
+
+@dataclass
+class ResourceUsage:
+    peak_rss: int = 0  # bytes, the peak of total rss of the process tree.
+    cpu_time: float = 0.0  # seconds, user + system, of the process tree.
+    read_bytes: int = 0
+    write_bytes: int = 0
+    wall_time: float = 0.0  # seconds
+
+    def __str__(self) -> str:
+        return (
+            'wall {:.2f}s, cpu {:.2f}s, peak rss {:.1f}MB, '
+            'read {:.1f}MB, write {:.1f}MB'.format(
+                self.wall_time,
+                self.cpu_time,
+                self.peak_rss / 1024**2,
+                self.read_bytes / 1024**2,
+                self.write_bytes / 1024**2,
+            )
+        )
+
+
+class ResourceSampler:
+    """
+    sample the resource usage of a process and all its descendants.
+    `sample` is called periodically by the process registry's watcher thread,
+    so no extra thread is created for it.
+    the cpu time and io bytes of a descendant are counted by its last sample,
+    so a short-lived descendant which exits between two samples may be
+    missed.
+    """
+
+    interval: float
+    next_time: float
+    usage: ResourceUsage
+    _counters: t.Dict[t.Tuple[int, float], t.Tuple[float, int, int]]
+    #   {(pid, create_time): (cpu_time, read_bytes, write_bytes), ...}
+
+    def __init__(
+        self,
+        pid: int,
+        interval: float = 0.2,
+        callback: t.Optional[t.Callable[[ResourceUsage], t.Any]] = None,
+    ) -> None:
+        self.interval = interval
+        self.next_time = 0
+        self.pid = pid
+        self.usage = ResourceUsage()
+        self._callback = callback
+        self._counters = {}
+        self._lock = Lock()
+        self._start = time()
+        self._stopped = False
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    def sample(self) -> None:
+        with self._lock:
+            if not self._stopped:
+                self._sample()
+
+    def stop(self) -> ResourceUsage:
+        """
+        take the last sample and freeze the usage. the callback is called
+        once here.
+        """
+        with self._lock:
+            if self._stopped:
+                return self.usage
+            self._sample()
+            self._stopped = True
+            self.usage.wall_time = time() - self._start
+        if self._callback:
+            self._callback(self.usage)
+        return self.usage
+
+    def _sample(self) -> None:
+        self.next_time = time() + self.interval
+        try:
+            root = psutil.Process(self.pid)
+            procs = (root, *root.children(recursive=True))
+        except psutil.Error:
+            return
+        rss = 0
+        for p in procs:
+            try:
+                with p.oneshot():
+                    key = (p.pid, p.create_time())
+                    rss += p.memory_info().rss
+                    cpu = p.cpu_times()
+                    try:
+                        io = p.io_counters()  # not available on macos.
+                    except (AttributeError, psutil.AccessDenied):
+                        io = None
+            except psutil.Error:
+                continue
+            self._counters[key] = (
+                cpu.user + cpu.system,
+                io.read_bytes if io else 0,
+                io.write_bytes if io else 0,
+            )
+        usage = self.usage
+        usage.peak_rss = max(usage.peak_rss, rss)
+        usage.cpu_time = sum(x[0] for x in self._counters.values())
+        usage.read_bytes = sum(x[1] for x in self._counters.values())
+        usage.write_bytes = sum(x[2] for x in self._counters.values())
@@ -1,40 +1,86 @@
+import asyncio
 import atexit
 import os
 import psutil
 import re
+import selectors
 import shlex
+import signal
+import socket
 import subprocess as sp
+import sys
 import typing as t
-from time import sleep
+from collections import deque
+from dataclasses import dataclass
+from threading import Lock
+from time import time
 
 from neoprint import bprint
 from rich.text import Text
 
 from .threading import Thread
 from .threading import new_thread
-from .threading import run_new_thread
+from .threading import thread_manager
 from .. import textwrap
+from .resource_usage import ResourceSampler
+from .resource_usage import ResourceUsage
+from ..binding import Signal
+
+
+class T:
+    IONice = t.Union[int, t.Tuple[int, int]]
+    LineCallback = t.Union[t.Callable[[str], t.Any], Signal]
+
 
 _ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+_CHUNK_SIZE = 64 * 1024
+_LINE_BREAK = re.compile(rb'\r\n|\n|\r')
+_SIGPIPE = getattr(signal, 'SIGPIPE', 0)  # not available on windows.
 
 
 class Popen(sp.Popen):
     communication_thread: t.Optional[Thread]
+    sampler: t.Optional[ResourceSampler]
     _introspection: bool
 
-    def __init__(self, *args, keep_alive: bool = False, **kwargs) -> None:
+    def __init__(
+        self,
+        *args,
+        keep_alive: bool = False,
+        measure: bool = False,
+        on_usage: t.Optional[t.Callable[[ResourceUsage], t.Any]] = None,
+        **kwargs,
+    ) -> None:
+        """
+        params:
+            keep_alive: if true, print a warning when the process exits by
+                itself (i.e. not killed by us).
+            measure: if true, sample the resource usage of the process tree
+                until it exits. see `usage`.
+            on_usage: called with the final `ResourceUsage` once the process
+                exits. implies `measure=True`.
+        """
         super().__init__(*args, **kwargs)
         self.communication_thread = None
-        self._introspection = False
-        atexit.register(self.kill)
-        if keep_alive:
-            self._watch_self_status()
+        self.sampler = None
+        self._introspection = keep_alive
+        if measure or on_usage:
+            self.sampler = ResourceSampler(self.pid, callback=on_usage)
+        process_registry.register(self)
 
     @property
     def is_alive(self) -> bool:
         # return self.poll() is None
         return psutil.pid_exists(self.pid) and self.poll() is None
 
+    @property
+    def usage(self) -> t.Optional[ResourceUsage]:
+        """
+        the resource usage of the process tree, it keeps updating until the
+        process exits. None if the process is not measured.
+        """
+        return self.sampler.usage if self.sampler else None
+
     def kill(self) -> None:
         """
         kill self and child processes.
@@ -67,16 +113,180 @@ class Popen(sp.Popen):
             print('cut off subprocess printing.', ':v7')
             self.communication_thread.kill()
 
-    @new_thread()
-    def _watch_self_status(self) -> None:
-        self._introspection = True
-        while self._introspection:
-            if self.is_alive:
-                sleep(1)
+    def _stop_measuring(self) -> None:
+        """
+        take the last sample before the process is reaped (we can still read
+        its counters while it is a zombie), then stop the sampler.
+        """
+        if self.sampler is None or self.sampler.stopped:
+            return
+        if self.returncode is None and hasattr(os, 'waitid'):
+            try:  # wait for exit, but leave it unreaped.
+                os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOWAIT)
+            except ChildProcessError:
+                pass
+        self.sampler.stop()
+        process_registry.remove_sampler(self.sampler)
+
+
+class ProcessRegistry:
+    """
+    keep track of all live `Popen` objects with one watcher thread.
+    on linux, the watcher blocks on the pidfds of all processes at once. on
+    other platforms (or old kernels without pidfd), it polls the processes
+    every `poll_interval` seconds instead.
+    exited processes are reaped, removed from the registry and announced by
+    `process_exited` signal. at exit, only the live processes are killed.
+    the same thread also drives the resource samplers, see `add_sampler`.
+    """
+
+    poll_interval: float = 0.5
+    process_exited: Signal  # Signal[Popen]
+    _fds: t.Dict[int, int]  # {pid: pidfd, ...}
+    _pending: t.List[Popen]
+    _processes: t.Dict[int, Popen]  # {pid: process, ...}
+    _samplers: t.Set[ResourceSampler]
+    _use_pidfd: bool
+    _watching: bool
+
+    def __init__(self) -> None:
+        self.process_exited = Signal()
+        self._fds = {}
+        self._lock = Lock()
+        self._pending = []
+        self._processes = {}
+        self._samplers = set()
+        self._selector = selectors.DefaultSelector()
+        self._use_pidfd = hasattr(os, 'pidfd_open')
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._watching = False
+        atexit.register(self.kill_all)
+
+    def __len__(self) -> int:
+        return len(self._processes)
+
+    @property
+    def processes(self) -> t.Tuple[Popen, ...]:
+        return tuple(self._processes.values())
+
+    def register(self, process: Popen) -> None:
+        with self._lock:
+            self._processes[process.pid] = process
+            self._pending.append(process)
+            if process.sampler:
+                self._samplers.add(process.sampler)
+            self._start_or_wakeup()
+
+    def add_sampler(self, sampler: ResourceSampler) -> None:
+        """
+        sample periodically until `remove_sampler` is called. this is for the
+        processes not created by `Popen`, e.g. asyncio subprocesses.
+        """
+        with self._lock:
+            self._samplers.add(sampler)
+            self._start_or_wakeup()
+
+    def remove_sampler(self, sampler: ResourceSampler) -> None:
+        with self._lock:
+            self._samplers.discard(sampler)
+
+    def kill_all(self) -> None:
+        for process in self.processes:
+            try:
+                process.kill()
+            except Exception as e:
+                # do not leave the other processes running.
+                print(':e', e)
+
+    def _start_or_wakeup(self) -> None:
+        # note: call this with `self._lock` held.
+        if self._watching:
+            self._wakeup()
+        else:
+            self._watching = True
+            self._mainloop()
+
+    def _wakeup(self) -> None:
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # the buffer is full, which means a wakeup is pending.
+
+    @new_thread(group='lk_utils')
+    def _mainloop(self) -> None:
+        exited: t.List[Popen] = []
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                if not self._processes and not self._samplers:
+                    self._watching = False
+                    return
+                samplers = tuple(self._samplers)
+            for process in pending:
+                self._watch(process)
+
+            exited.clear()
+            if len(self._fds) == len(self._processes):
+                timeout = None
             else:
-                print(':v8', 'process has exited unexpectly.')
-                self._introspection = False
-                return
+                timeout = self.poll_interval
+            if samplers:
+                now = time()
+                for sampler in samplers:
+                    if now >= sampler.next_time:
+                        sampler.sample()
+                wait = min(x.next_time for x in samplers) - now
+                if timeout is not None:
+                    wait = min(wait, timeout)
+                timeout = max(0, wait)
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._wakeup_r:
+                    try:
+                        while self._wakeup_r.recv(1024):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    exited.append(key.data)
+            for pid, process in tuple(self._processes.items()):
+                if pid not in self._fds and process.poll() is not None:
+                    exited.append(process)
+
+            for process in exited:
+                self._on_exit(process)
+
+    def _on_exit(self, process: Popen) -> None:
+        process._stop_measuring()
+        process.poll()  # reap it.
+        if (fd := self._fds.pop(process.pid, None)) is not None:
+            self._selector.unregister(fd)
+            os.close(fd)
+        with self._lock:
+            self._processes.pop(process.pid, None)
+        if process._introspection:
+            print(':v8', 'process has exited unexpectly.', process.args)
+            process._introspection = False
+        self.process_exited.emit(process)
+
+    def _watch(self, process: Popen) -> None:
+        if not self._use_pidfd:
+            return
+        try:
+            fd = os.pidfd_open(process.pid)
+        except ProcessLookupError:
+            return  # already reaped, let the polling path handle it.
+        except OSError:
+            # pidfd is not supported by the kernel. fall back to polling.
+            self._use_pidfd = False
+            return
+        self._fds[process.pid] = fd
+        self._selector.register(fd, selectors.EVENT_READ, process)
+
+
+process_registry = ProcessRegistry()
 
 
 def compose_cmd(*args: t.Any, filter: bool = True) -> t.List[str]:
@@ -122,6 +332,16 @@ def run_cmd_args(
     ignore_return: bool = False,
     force_term_color: bool = False,
     filter: bool = True,
+    tail_lines: int = 0,
+    tail_bytes: int = 0,
+    log_file: t.Optional[str] = None,
+    on_stdout: t.Optional[T.LineCallback] = None,
+    on_stderr: t.Optional[T.LineCallback] = None,
+    measure: bool = False,
+    on_usage: t.Optional[t.Callable[[ResourceUsage], t.Any]] = None,
+    cpu_affinity: t.Optional[t.Sequence[int]] = None,
+    nice: t.Optional[int] = None,
+    ionice: t.Optional[T.IONice] = None,
     # subprocess_scheme: str = 'default',
     # subprocess_scheme: str = os.getenv('LK_SUBPROCESS_SCHEME', 'default'),
     _refmt_args: bool = True,
@@ -144,11 +364,48 @@ def run_cmd_args(
                     https://github.com/Textualize/rich/issues/2622
                     https://rich.readthedocs.io/en/stable/console.html#terminal
                     -detection
+        tail_lines, tail_bytes:
+            if set, only the last n lines (or the last n bytes) of the output
+            are kept in memory, the earlier lines are dropped. this is useful
+            for long-running commands which print a lot.
+            the returned string is the tail, and the error message shows the
+            tail too.
+        log_file: if set, the full output is also written to this file.
+        on_stdout, on_stderr:
+            a callable or a `Signal`, which receives every line (without
+            '\n' at the end) from stdout or stderr as soon as it arrives.
+            if any of them is given, stderr is no longer merged into stdout,
+            both streams are read by one thread via `selectors`, and the
+            output is not collected -- only a short tail (`tail_lines`,
+            default 20) is kept for the error message.
+        measure, on_usage:
+            sample peak rss, cpu time, io bytes and wall time of the whole
+            process tree. the final `ResourceUsage` is passed to `on_usage`
+            when the process exits. in non-blocking mode, you can also read
+            it from `<Popen>.usage`.
+        cpu_affinity, nice, ionice:
+            scheduling options for the child process. on posix,
+            `cpu_affinity` and `nice` are set in the child before it executes
+            the command, so its own children inherit them. the others (and
+            all of them on windows) are set via psutil right after it
+            starts, so the first instants of the command (and children
+            forked in them) may run without them. options which cannot be
+            applied (e.g. a negative nice without privilege) are reported by
+            a warning.
+            cpu_affinity: a list of cpu indexes the process may run on.
+                supported on linux, windows and freebsd.
+            nice: the niceness (on windows, a psutil priority class
+                constant, e.g. `psutil.BELOW_NORMAL_PRIORITY_CLASS`).
+            ionice: `ioclass` or `(ioclass, value)`, for example
+                `psutil.IOPRIO_CLASS_IDLE`. supported on linux and windows.
         _refmt_args: set to False is faster. this is for internal use.
 
     returns:
-        if ignore_return:
-            return None
+        if ignore_return or on_stdout or on_stderr:
+            if blocking:
+                return None
+            else:
+                return <Popen object>
         else:
             if blocking:
                 return <string>
@@ -174,67 +431,8 @@ def run_cmd_args(
         """
         yield: line, without '\n' at the end.
         """
-
-        def readlines(source: t.IO) -> t.Iterator[str]:
-            last: bytes = b''
-            curr: bytes
-            temp: bytes = b''
-            while True:
-                try:
-                    if curr := source.read(1):
-                        if curr == b'\n':
-                            temp += curr
-                            yield temp.decode(errors='ignore')
-                            temp = b''
-                        elif last == b'\r':
-                            yield temp.decode(errors='ignore')
-                            temp = curr
-                        else:
-                            temp += curr
-                        last = curr
-                    else:
-                        break
-                except Exception as e:
-                    print(':e', e)
-                    break
-            if temp:
-                yield (temp + b'\n').decode(errors='ignore')
-
-        for line in readlines(process.stdout):  # type: ignore
-            if verbose:
-                bprint(line, end='', flush=True)
-            if remove_ansi_code:
-                yield _ANSI_ESCAPE.sub('', line)
-            else:
-                yield line.rstrip()
-
-    def format_error(stdout: str) -> str:
-        if verbose:  # we have printed the stdout, so do nothing.
-            pass
-        else:  # better to dump the stdout message to console.
-            if stdout:
-                print(':s1v7', 'original output from subprocess:')
-                print(
-                    ':s1r1',
-                    Text.from_ansi(textwrap.wrap(stdout, 4), style='red dim'),
-                )
-            # print(':dv8', 'subprocess error')
-        return textwrap.wrap(
-            """
-            error happened with exit code {}.
-            the origin run command is:
-                {}
-            each element is:
-                {}
-            """,
-            lstrip=False,
-        ).format(
-            retcode,
-            ' '.join(args),
-            textwrap.join(
-                ('{:<2}  {}'.format(i, x) for i, x in enumerate(args, 1)), 8
-            ),
-        )
+        for line in _readlines(process.stdout):  # type: ignore
+            yield _handle_line(line, verbose, remove_ansi_code)
 
     """
     backup: the 'pty' scheme:
@@ -253,22 +451,15 @@ def run_cmd_args(
             ...
     """
 
-    if env is None:
-        if force_term_color:
-            env = os.environ.copy()
-            env['LK_LOGGER_FORCE_COLOR'] = '1'
-        else:
-            env = t.cast(dict, os.environ)
-    else:
-        if force_term_color:
-            env['LK_LOGGER_FORCE_COLOR'] = '1'
+    env = _prepare_env(env, force_term_color)
     # note: do not use `with sp.Popen(...) as process` statement, the child
     # process may exit before communicating, which raises 'ValueError: read of
     # closed file' or 'invalid arguments' error.
+    streaming = on_stdout is not None or on_stderr is not None
     process = Popen(
         args,
         stdout=sp.PIPE,
-        stderr=sp.STDOUT,
+        stderr=sp.PIPE if streaming else sp.STDOUT,
         cwd=cwd,
         shell=shell,
         # set `text` to False. since `text` will translate all types of newline
@@ -276,28 +467,54 @@ def run_cmd_args(
         # printing progress bar.
         text=False,
         env=env,
+        measure=measure,
+        on_usage=on_usage,
+        preexec_fn=_scheduling_hook(cpu_affinity, nice),
     )
+    _apply_scheduling(process.pid, cpu_affinity, nice, ionice)
+
+    if streaming:
+        capture = _OutputCapture(tail_lines or 20, tail_bytes, log_file)
+        if not blocking:
+            process.communication_thread = _run_internal_thread(
+                _select_lines,
+                process,
+                on_stdout,
+                on_stderr,
+                verbose,
+                force_term_color,
+                capture,
+                interruptible=True,
+            )
+            return process
+        for _ in _select_lines(
+            process, on_stdout, on_stderr, verbose, force_term_color, capture
+        ):
+            pass
+        process._stop_measuring()
+        if (retcode := process.wait()) and not ignore_error:
+            raise Exception(
+                _format_error(
+                    args, retcode, capture.getvalue(), verbose, capture
+                )
+            )
+        return None
 
     if blocking:
-        comm = communicate(remove_ansi_code=force_term_color)
-        if ignore_return:
-            for _ in comm:
-                pass
-            stdout = None
-        else:
-            stdout = '\n'.join(comm)
-        if retcode := process.wait():
-            if ignore_error:
-                return stdout
-            else:
-                # show_error(stdout)
-                # sys.exit(retcode)
-                raise Exception(format_error(stdout))
-        else:
-            return stdout
+        return _wait_output(
+            process,
+            args,
+            verbose,
+            force_term_color,
+            ignore_error,
+            ignore_return,
+            tail_lines,
+            tail_bytes,
+            log_file,
+        )
     else:
         if verbose:
-            process.communication_thread = run_new_thread(
+            process.communication_thread = _run_internal_thread(
                 communicate, False, interruptible=True
             )
         return process
@@ -307,3 +524,862 @@ def run_cmd_line(cmd: str, **kwargs) -> t.Union[str, Popen, None]:
     return run_cmd_args(
         *shlex.split(cmd), **kwargs, filter=False, _refmt_args=False
     )
+
+
+def run_cmd_pipeline(
+    *commands: t.Any,
+    verbose: bool = False,
+    cwd: t.Optional[str] = None,
+    env: t.Optional[t.Dict[str, str]] = None,
+    stdin: t.Union[str, t.IO, None] = None,
+    stdout: t.Union[str, t.IO, None] = None,
+    ignore_error: bool = False,
+    ignore_return: bool = False,
+    force_term_color: bool = False,
+    tail_lines: int = 0,
+    tail_bytes: int = 0,
+    log_file: t.Optional[str] = None,
+) -> t.Optional[str]:
+    """
+    run `cmd1 | cmd2 | cmd3 ...` without a shell.
+    the stdout of each command is connected to the stdin of the next one by
+    an os pipe, the data never passes through python. only the output of the
+    last command is read, the same way as `run_cmd_args` does.
+
+    params:
+        commands: each command is either a string (parsed like
+            `run_cmd_line`) or a tuple/list (composed like `run_cmd_args`).
+        stdin: a file path or a binary file object, feeds the first command.
+        stdout: a file path or a binary file object, receives the output of
+            the last command directly. in this case nothing is returned.
+        the other params have the same meaning as in `run_cmd_args`.
+        stderr of the commands except the last one is printed if `verbose`,
+        its tail (`tail_lines`, default 20) is kept for the error message.
+
+    returns:
+        the output of the last command, or None if `ignore_return` or
+        `stdout` is set.
+        if any command fails, the first failed one is reported with its own
+        output (like `set -o pipefail` in bash). a command killed by SIGPIPE
+        is not a failure if it is not the last one, since it is the result
+        of the downstream command exiting early, e.g. `yes | head -1`.
+    """
+    all_args = tuple(
+        shlex.split(x) if isinstance(x, str) else compose_cmd(x)
+        for x in commands
+    )
+    if verbose:
+        print(
+            '[magenta dim]{}[/]'.format(
+                ' | '.join(' '.join(x) for x in all_args)
+            ),
+            ':psr',
+        )
+    env = _prepare_env(env, force_term_color)
+
+    files = []
+    if isinstance(stdin, str):
+        stdin = open(stdin, 'rb')
+        files.append(stdin)
+    if isinstance(stdout, str):
+        stdout = open(stdout, 'wb')
+        files.append(stdout)
+
+    captures: t.List[t.Optional[_OutputCapture]] = []
+    processes: t.List[Popen] = []
+    readers: t.List[Thread] = []
+    upstream = stdin
+    try:
+        for i, args in enumerate(all_args):
+            is_last = i == len(all_args) - 1
+            if is_last and stdout is not None:
+                out, err = stdout, None
+            else:
+                out, err = sp.PIPE, sp.STDOUT if is_last else sp.PIPE
+            processes.append(
+                Popen(
+                    args,
+                    stdin=upstream,
+                    stdout=out,
+                    stderr=err,
+                    cwd=cwd,
+                    env=env,
+                    text=False,
+                )
+            )
+            if is_last:
+                captures.append(None)
+            else:
+                captures.append(_OutputCapture(tail_lines or 20))
+                readers.append(
+                    _run_internal_thread(
+                        _drain_lines,
+                        processes[-1].stderr,
+                        verbose,
+                        force_term_color,
+                        captures[-1],
+                    )
+                )
+            if i > 0:
+                # close our copy of the pipe, so that the upstream command
+                # receives SIGPIPE if the downstream one exits early.
+                upstream.close()  # type: ignore
+            upstream = processes[-1].stdout
+    except BaseException:
+        # a command cannot be started, do not leave the started ones blocked
+        # on their pipes.
+        for process in processes:
+            process.kill()
+            if process.stdout:
+                process.stdout.close()
+            process.wait()
+        for reader in readers:
+            reader.join()
+        raise
+    finally:
+        for f in files:
+            f.close()  # the children have inherited them.
+
+    if stdout is None:
+        output = _wait_output(
+            processes[-1],
+            all_args[-1],
+            verbose,
+            force_term_color,
+            ignore_error=True,
+            ignore_return=ignore_return,
+            tail_lines=tail_lines,
+            tail_bytes=tail_bytes,
+            log_file=log_file,
+        )
+    else:
+        output = None
+    for reader in readers:
+        reader.join()
+    if ignore_error:
+        return output
+    for i, (args, process, capture) in enumerate(
+        zip(all_args, processes, captures)
+    ):
+        if not (retcode := process.wait()):
+            continue
+        if capture is not None and retcode == -_SIGPIPE:
+            continue  # the downstream command exited early.
+        if capture is None:
+            raise Exception(_format_error(args, retcode, output, verbose))
+        raise Exception(
+            _format_error(args, retcode, capture.getvalue(), verbose, capture)
+        )
+    return output
+
+
+async def arun_cmd_args(
+    *args: t.Any,
+    verbose: bool = False,
+    cwd: t.Optional[str] = None,
+    env: t.Optional[t.Dict[str, str]] = None,
+    ignore_error: bool = False,
+    ignore_return: bool = False,
+    force_term_color: bool = False,
+    filter: bool = True,
+    tail_lines: int = 0,
+    tail_bytes: int = 0,
+    log_file: t.Optional[str] = None,
+    on_usage: t.Optional[t.Callable[[ResourceUsage], t.Any]] = None,
+    cpu_affinity: t.Optional[t.Sequence[int]] = None,
+    nice: t.Optional[int] = None,
+    ionice: t.Optional[T.IONice] = None,
+    _refmt_args: bool = True,
+) -> t.Optional[str]:
+    """
+    the asyncio version of `run_cmd_args`.
+    the child process is driven by the running event loop, no extra thread is
+    created for reading its output. so it is cheap to run hundreds of commands
+    concurrently, for example by `asyncio.gather`.
+    if the coroutine is cancelled, the child process will be killed.
+    note: with `on_usage`, the usage is sampled every 0.2s while the process
+    is running, the counters after the last sample are not included.
+
+    returns:
+        if ignore_return:
+            return None
+        else:
+            return <string>
+    """
+    if _refmt_args:
+        args = compose_cmd(*args, filter=filter)  # type: ignore
+    if verbose:
+        print('[magenta dim]{}[/]'.format(' '.join(args)), ':psr')
+
+    if ignore_return and not (tail_lines or tail_bytes or log_file):
+        capture = None
+    else:
+        capture = _OutputCapture(tail_lines, tail_bytes, log_file)
+    retcode = await _acommunicate(
+        args,
+        verbose,
+        cwd,
+        env,
+        force_term_color,
+        capture,
+        on_usage,
+        (cpu_affinity, nice, ionice),
+    )
+    stdout = capture.getvalue() if capture is not None else None
+    if retcode and not ignore_error:
+        raise Exception(_format_error(args, retcode, stdout, verbose, capture))
+    return None if ignore_return else stdout
+
+
+async def arun_cmd_line(cmd: str, **kwargs) -> t.Optional[str]:
+    return await arun_cmd_args(
+        *shlex.split(cmd), **kwargs, filter=False, _refmt_args=False
+    )
+
+
+@dataclass
+class CmdResult:
+    args: t.List[str]
+    exit_code: t.Optional[int]  # None means the command was cancelled.
+    stdout: t.Optional[str]
+    duration: float = 0.0
+    usage: t.Optional[ResourceUsage] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+
+def run_cmd_batch(
+    commands: t.Union[t.Sequence[t.Any], t.Dict[str, t.Any]],
+    max_workers: t.Optional[int] = None,
+    fail_fast: bool = False,
+    verbose: bool = False,
+    cwd: t.Optional[str] = None,
+    env: t.Optional[t.Dict[str, str]] = None,
+    ignore_return: bool = False,
+    force_term_color: bool = False,
+    measure: bool = False,
+    pin_cpus: bool = False,
+    nice: t.Optional[int] = None,
+    ionice: t.Optional[T.IONice] = None,
+) -> t.List[CmdResult]:
+    """
+    run many commands in parallel, at most `max_workers` at the same time.
+
+    params:
+        commands: a list of commands, or a dict of `{name: command}`.
+            each command is either a string (parsed like `run_cmd_line`) or a
+            tuple/list (composed like `run_cmd_args`).
+            when `verbose` is true, every printed line is prefixed with the
+            command's name (or 1-based index), e.g. '[2] ...'.
+        max_workers: default to the number of cpu cores.
+        fail_fast:
+            true: once a command fails, the running ones are killed, the
+                pending ones are dropped, and an exception is raised.
+            false: all commands are run, check `CmdResult.exit_code` to see
+                which one failed. a command which cannot be started (e.g.
+                not found) gets exit code 127, and the error text as its
+                stdout.
+        measure: if true, fill `CmdResult.usage` with the resource usage of
+            each command. see also `arun_cmd_args(on_usage=...)`.
+        pin_cpus: if true, the usable cpus are split into `max_workers`
+            disjoint sets, each running command is pinned to a free set.
+            this avoids concurrent jobs thrashing each other's caches.
+        nice, ionice: applied to every command, see `run_cmd_args`.
+
+    returns:
+        a list of `CmdResult`, in the same order as `commands`.
+    """
+    return asyncio.run(
+        arun_cmd_batch(
+            commands,
+            max_workers,
+            fail_fast,
+            verbose,
+            cwd,
+            env,
+            ignore_return,
+            force_term_color,
+            measure,
+            pin_cpus,
+            nice,
+            ionice,
+        )
+    )
+
+
+async def arun_cmd_batch(
+    commands: t.Union[t.Sequence[t.Any], t.Dict[str, t.Any]],
+    max_workers: t.Optional[int] = None,
+    fail_fast: bool = False,
+    verbose: bool = False,
+    cwd: t.Optional[str] = None,
+    env: t.Optional[t.Dict[str, str]] = None,
+    ignore_return: bool = False,
+    force_term_color: bool = False,
+    measure: bool = False,
+    pin_cpus: bool = False,
+    nice: t.Optional[int] = None,
+    ionice: t.Optional[T.IONice] = None,
+) -> t.List[CmdResult]:
+    """the asyncio version of `run_cmd_batch`."""
+    if isinstance(commands, dict):
+        names = tuple(commands.keys())
+        commands = tuple(commands.values())
+    else:
+        names = tuple(range(1, len(commands) + 1))
+    all_args = tuple(
+        shlex.split(x) if isinstance(x, str) else compose_cmd(x)
+        for x in commands
+    )
+    results = [CmdResult(x, None, None) for x in all_args]
+    max_workers = max_workers or os.cpu_count() or 1
+    semaphore = asyncio.Semaphore(max_workers)
+    cpu_sets = _split_cpus(max_workers) if pin_cpus else []
+
+    async def run(index: int) -> None:
+        async with semaphore:
+            args = all_args[index]
+            if verbose:
+                print(
+                    '[magenta dim]\\[{}] {}[/]'.format(
+                        names[index], ' '.join(args)
+                    ),
+                    ':psr',
+                )
+            start = time()
+            capture = None if ignore_return else _OutputCapture()
+            usage = []
+            cpus = cpu_sets.pop(0) if cpu_sets else None
+            try:
+                retcode = await _acommunicate(
+                    args,
+                    verbose,
+                    cwd,
+                    env,
+                    force_term_color,
+                    capture,
+                    usage.append if measure else None,
+                    (cpus, nice, ionice),
+                    prefix='[{}] '.format(names[index]),
+                )
+            except OSError as e:
+                # the command cannot be started, e.g. it is not found.
+                if fail_fast:
+                    raise
+                print(':e', '[{}] {}'.format(names[index], e))
+                retcode, stdout = 127, str(e)
+            else:
+                stdout = capture.getvalue() if capture is not None else None
+            finally:
+                if cpus:
+                    cpu_sets.append(cpus)
+            results[index] = CmdResult(
+                args, retcode, stdout, time() - start, *usage
+            )
+            if retcode and fail_fast:
+                raise Exception(_format_error(args, retcode, stdout, verbose))
+
+    tasks = [asyncio.ensure_future(run(i)) for i in range(len(all_args))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
+
+
+async def _acommunicate(
+    args: t.Sequence[str],
+    verbose: bool,
+    cwd: t.Optional[str],
+    env: t.Optional[t.Dict[str, str]],
+    force_term_color: bool,
+    capture: t.Optional['_OutputCapture'],
+    on_usage: t.Optional[t.Callable[[ResourceUsage], t.Any]] = None,
+    scheduling: t.Tuple[t.Any, ...] = (None, None, None),
+    prefix: str = '',
+) -> int:
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        cwd=cwd,
+        env=_prepare_env(env, force_term_color),
+        preexec_fn=_scheduling_hook(*scheduling[:2]),
+    )
+    _apply_scheduling(process.pid, *scheduling)
+    if on_usage:
+        sampler = ResourceSampler(process.pid, callback=on_usage)
+        process_registry.add_sampler(sampler)
+    else:
+        sampler = None
+    buffer = _LineBuffer()
+    try:
+        while True:
+            chunk = await process.stdout.read(_CHUNK_SIZE)  # type: ignore
+            for line in buffer.feed(chunk) if chunk else buffer.flush():
+                line = _handle_line(line, verbose, force_term_color, prefix)
+                if capture is not None:
+                    capture.put(line)
+            if not chunk:
+                break
+        retcode = await process.wait()
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        if capture is not None:
+            capture.close()
+        if sampler:
+            sampler.stop()
+            process_registry.remove_sampler(sampler)
+    return retcode
+
+
+def _apply_scheduling(
+    pid: int,
+    cpu_affinity: t.Optional[t.Sequence[int]] = None,
+    nice: t.Optional[int] = None,
+    ionice: t.Optional[T.IONice] = None,
+) -> None:
+    """
+    set the scheduling options via psutil from the parent, right after the
+    process starts.
+    on posix, `cpu_affinity` and `nice` have been set in the child by
+    `_scheduling_hook`. if the child still has the values inherited from us,
+    the hook has failed, we set them again here so that the failure is
+    reported. `ionice` is always set here, so it lands a little after the
+    command starts.
+    """
+    if cpu_affinity is None and nice is None and ionice is None:
+        return
+    try:
+        proc = psutil.Process(pid)
+        if sys.platform == 'win32':
+            inherited = None
+        else:
+            inherited = psutil.Process()
+        if cpu_affinity is not None and (
+            inherited is None
+            or sorted(proc.cpu_affinity())
+            == sorted(inherited.cpu_affinity())
+            != sorted(cpu_affinity)
+        ):
+            proc.cpu_affinity(list(cpu_affinity))
+        if nice is not None and (
+            inherited is None or proc.nice() == inherited.nice() != nice
+        ):
+            proc.nice(nice)
+        if ionice is not None:
+            if isinstance(ionice, tuple):
+                proc.ionice(*ionice)
+            else:
+                proc.ionice(ionice)
+    except psutil.NoSuchProcess:
+        pass  # it has exited.
+    except (AttributeError, psutil.AccessDenied, OSError, ValueError) as e:
+        # AttributeError: the feature is not supported on this platform.
+        print(':v6', 'failed to set scheduling options for process', pid, e)
+
+
+def _scheduling_hook(
+    cpu_affinity: t.Optional[t.Sequence[int]] = None,
+    nice: t.Optional[int] = None,
+) -> t.Optional[t.Callable[[], None]]:
+    """
+    return a `preexec_fn` which sets the affinity and niceness in the forked
+    child, before exec, so the command and its children never run without
+    them. None on windows, or if no option is given.
+    note: `preexec_fn` is not safe when the parent has other threads, which
+    is always the case with lk_utils (e.g. the process watcher). so the hook
+    only makes two plain system calls, without importing, locking or
+    printing. ionice is not set here since it needs psutil, see
+    `_apply_scheduling`. `preexec_fn` is not supported in subinterpreters
+    either, do not pass scheduling options there.
+    """
+    if sys.platform == 'win32':
+        return None
+    if cpu_affinity is None and nice is None:
+        return None
+    if not hasattr(os, 'sched_setaffinity'):
+        cpu_affinity = None  # e.g. macos, reported by `_apply_scheduling`.
+
+    def hook() -> None:
+        # note: this runs in the child, errors are checked by the parent.
+        if cpu_affinity is not None:
+            try:
+                os.sched_setaffinity(0, cpu_affinity)
+            except OSError:
+                pass
+        if nice is not None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, nice)
+            except OSError:
+                pass
+
+    return hook
+
+
+def _drain_lines(
+    source: t.IO,
+    verbose: bool,
+    remove_ansi_code: bool,
+    capture: '_OutputCapture',
+) -> None:
+    """
+    read the lines from `source` into `capture`, and print them if
+    `verbose`.
+    """
+    try:
+        for line in _readlines(source):
+            capture.put(_handle_line(line, verbose, remove_ansi_code))
+    finally:
+        source.close()
+        capture.close()
+
+
+def _format_error(
+    args: t.Sequence[str],
+    retcode: int,
+    stdout: t.Optional[str],
+    verbose: bool,
+    capture: t.Optional['_OutputCapture'] = None,
+) -> str:
+    if verbose:  # we have printed the stdout, so do nothing.
+        pass
+    else:  # better to dump the stdout message to console.
+        if stdout:
+            if capture is not None and capture.dropped:
+                print(
+                    ':s1v7',
+                    'original output from subprocess (the last {} lines, {} '
+                    'earlier lines are omitted):'.format(
+                        len(capture), capture.dropped
+                    ),
+                )
+            else:
+                print(':s1v7', 'original output from subprocess:')
+            print(
+                ':s1r1',
+                Text.from_ansi(textwrap.wrap(stdout, 4), style='red dim'),
+            )
+        # print(':dv8', 'subprocess error')
+    out = textwrap.wrap(
+        """
+        error happened with exit code {}.
+        the origin run command is:
+            {}
+        each element is:
+            {}
+        """,
+        lstrip=False,
+    ).format(
+        retcode,
+        ' '.join(args),
+        textwrap.join(
+            ('{:<2}  {}'.format(i, x) for i, x in enumerate(args, 1)), 8
+        ),
+    )
+    if capture is not None and capture.log_file:
+        out += '\nthe full output is saved to:\n    {}'.format(capture.log_file)
+    return out
+
+
+def _split_cpus(n: int) -> t.List[t.List[int]]:
+    """
+    split the usable cpus into `n` disjoint sets of adjacent cpus. if there
+    are fewer cpus than `n`, some sets have to share a cpu.
+    """
+    try:
+        cpus = psutil.Process().cpu_affinity()
+    except AttributeError:  # not supported on macos.
+        cpus = list(range(psutil.cpu_count() or 1))
+    if n >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(n)]
+    size, rest = divmod(len(cpus), n)
+    out = []
+    start = 0
+    for i in range(n):
+        end = start + size + (1 if i < rest else 0)
+        out.append(cpus[start:end])
+        start = end
+    return out
+
+
+def _handle_line(
+    line: str,
+    verbose: bool,
+    remove_ansi_code: t.Optional[bool],
+    prefix: str = '',
+) -> str:
+    if verbose:
+        bprint(prefix + line, end='', flush=True)
+    if remove_ansi_code:
+        return _ANSI_ESCAPE.sub('', line)
+    else:
+        return line.rstrip()
+
+
+def _prepare_env(
+    env: t.Optional[t.Dict[str, str]], force_term_color: bool
+) -> t.Dict[str, str]:
+    if env is None:
+        if force_term_color:
+            env = os.environ.copy()
+            env['LK_LOGGER_FORCE_COLOR'] = '1'
+        else:
+            env = t.cast(dict, os.environ)
+    else:
+        if force_term_color:
+            env['LK_LOGGER_FORCE_COLOR'] = '1'
+    return env
+
+
+def _run_internal_thread(
+    target: t.Callable, *args, interruptible: bool = False
+) -> Thread:
+    # long-running helper threads live in the "lk_utils" group, so they never
+    # occupy the workers of a bounded pool set by user for other groups.
+    return thread_manager._create_thread(
+        'lk_utils',
+        id(target),
+        target,
+        args,
+        {},
+        interruptible=interruptible,
+    )
+
+
+class _OutputCapture:
+    """
+    collect the output lines of a subprocess.
+    if `max_lines` or `max_bytes` is set, it works as a ring buffer which only
+    keeps the tail of the output. if `log_file` is set, every line is also
+    written to the file.
+    """
+
+    dropped: int
+    log_file: t.Optional[str]
+    _lines: t.Deque[str]
+    _sizes: t.Deque[int]
+
+    def __init__(
+        self,
+        max_lines: int = 0,
+        max_bytes: int = 0,
+        log_file: t.Optional[str] = None,
+    ) -> None:
+        self.dropped = 0
+        self.log_file = log_file
+        self._lines = deque()
+        self._log = open(log_file, 'w', encoding='utf-8') if log_file else None
+        self._max_bytes = max_bytes
+        self._max_lines = max_lines
+        self._size = 0
+        self._sizes = deque()
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def close(self) -> None:
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    def getvalue(self) -> str:
+        return '\n'.join(self._lines)
+
+    def put(self, line: str) -> None:
+        if self._log:
+            self._log.write(line + '\n')
+        self._lines.append(line)
+        if self._max_bytes:
+            size = len(line.encode(errors='ignore')) + 1
+            self._sizes.append(size)
+            self._size += size
+            while self._size > self._max_bytes and len(self._lines) > 1:
+                self._lines.popleft()
+                self._size -= self._sizes.popleft()
+                self.dropped += 1
+        if self._max_lines and len(self._lines) > self._max_lines:
+            self._lines.popleft()
+            if self._max_bytes:
+                self._size -= self._sizes.popleft()
+            self.dropped += 1
+
+
+class _LineBuffer:
+    """
+    split incoming bytes into lines incrementally.
+    '\n', '\r\n' and a standalone '\r' are all treated as line breaks (the
+    standalone '\r' is used by progress bars to redraw the current line), the
+    line break is kept at the end of each yielded line.
+    """
+
+    def __init__(self) -> None:
+        self._hold = b''
+        self._pending: t.List[bytes] = []
+        #   pieces of the unfinished line. they are joined only when the line
+        #   break comes, so a long line costs linear time.
+
+    def feed(self, chunk: bytes) -> t.Iterator[str]:
+        data = self._hold + chunk
+        # a trailing '\r' may be the first half of '\r\n', hold it back until
+        # the next chunk comes.
+        if data.endswith(b'\r'):
+            data, self._hold = data[:-1], b'\r'
+        else:
+            self._hold = b''
+        start = 0
+        for m in _LINE_BREAK.finditer(data):
+            line = data[start : m.end()]
+            if self._pending:
+                self._pending.append(line)
+                line = b''.join(self._pending)
+                self._pending.clear()
+            yield line.decode(errors='ignore')
+            start = m.end()
+        if start < len(data):
+            self._pending.append(data[start:])
+
+    def flush(self) -> t.Iterator[str]:
+        rest = b''.join(self._pending) + self._hold
+        self._hold = b''
+        self._pending.clear()
+        if rest:
+            yield (rest + b'\n').decode(errors='ignore')
+
+
+def _wait_output(
+    process: Popen,
+    args: t.Sequence[str],
+    verbose: bool,
+    remove_ansi_code: bool,
+    ignore_error: bool,
+    ignore_return: bool,
+    tail_lines: int = 0,
+    tail_bytes: int = 0,
+    log_file: t.Optional[str] = None,
+) -> t.Optional[str]:
+    """
+    consume the merged output of the process until it exits.
+    """
+    lines = (
+        _handle_line(x, verbose, remove_ansi_code)
+        for x in _readlines(process.stdout)  # type: ignore
+    )
+    if ignore_return and not (tail_lines or tail_bytes or log_file):
+        for _ in lines:
+            pass
+        capture = None
+    else:
+        capture = _OutputCapture(tail_lines, tail_bytes, log_file)
+        for line in lines:
+            capture.put(line)
+        capture.close()
+    stdout = capture.getvalue() if capture is not None else None
+    process._stop_measuring()
+    if retcode := process.wait():
+        if ignore_error:
+            return None if ignore_return else stdout
+        else:
+            # show_error(stdout)
+            # sys.exit(retcode)
+            raise Exception(
+                _format_error(args, retcode, stdout, verbose, capture)
+            )
+    else:
+        return None if ignore_return else stdout
+
+
+def _select_lines(
+    process: Popen,
+    on_stdout: t.Optional[T.LineCallback],
+    on_stderr: t.Optional[T.LineCallback],
+    verbose: bool,
+    remove_ansi_code: bool,
+    capture: _OutputCapture,
+) -> t.Iterator[None]:
+    """
+    read stdout and stderr of the process separately in the current thread,
+    pass each line to its callback.
+    it yields after each read, as the break point of an interruptible thread
+    (see `Popen.kill`).
+    """
+    streams = []
+    for stream, callback in (
+        (process.stdout, on_stdout),
+        (process.stderr, on_stderr),
+    ):
+        if isinstance(callback, Signal):
+            callback = callback.emit
+        streams.append((stream, _LineBuffer(), callback))
+
+    def handle(lines: t.Iterable[str], callback: T.LineCallback) -> None:
+        for line in lines:
+            line = _handle_line(line, verbose, remove_ansi_code)
+            capture.put(line)
+            if callback is not None:
+                callback(line)
+
+    try:
+        if sys.platform == 'win32':
+            # `select` on windows only works with sockets, not pipes. read
+            # stderr in a helper thread instead.
+            def drain(stream: t.IO, buffer: _LineBuffer, callback) -> None:
+                fd = stream.fileno()
+                while chunk := os.read(fd, _CHUNK_SIZE):
+                    handle(buffer.feed(chunk), callback)
+                    yield
+                handle(buffer.flush(), callback)
+
+            helper = _run_internal_thread(
+                drain, *streams[1], interruptible=True
+            )
+            try:
+                yield from drain(*streams[0])
+            except GeneratorExit:
+                helper.kill()
+                raise
+            helper.join()
+            return
+
+        with selectors.DefaultSelector() as selector:
+            for stream, buffer, callback in streams:
+                selector.register(
+                    stream, selectors.EVENT_READ, (buffer, callback)
+                )
+            while selector.get_map():
+                for key, _ in selector.select():
+                    buffer, callback = key.data
+                    if chunk := os.read(key.fd, _CHUNK_SIZE):
+                        handle(buffer.feed(chunk), callback)
+                    else:
+                        selector.unregister(key.fileobj)
+                        handle(buffer.flush(), callback)
+                yield
+    finally:
+        capture.close()
+
+
+def _readlines(source: t.IO, chunk_size: int = _CHUNK_SIZE) -> t.Iterator[str]:
+    """
+    read from a binary pipe in chunks and yield lines with line break kept.
+    `os.read` returns as soon as some data is available, so the output is
+    still forwarded in realtime.
+    """
+    fd = source.fileno()
+    buffer = _LineBuffer()
+    while True:
+        try:
+            chunk = os.read(fd, chunk_size)
+        except Exception as e:
+            print(':e', e)
+            break
+        if not chunk:
+            break
+        yield from buffer.feed(chunk)
+    yield from buffer.flush()
@@ -1,8 +1,19 @@
 import inspect
+import os
+import sys
 import typing as t
 from collections import defaultdict
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import wait as wait_futures
+from functools import partial
 from functools import wraps
+from queue import Queue
+from threading import Lock
+from threading import RLock
+from threading import Semaphore
 from threading import Thread as _Thread
+from time import time
 from types import FrameType
 from types import GeneratorType
 from ..binding import Signal
@@ -35,15 +46,37 @@ class Thread:
         daemon: bool,
         interruptible: bool = False,
         start_now: bool = True,
+        pool: t.Union[
+            'WorkerPool', t.Callable[[], t.Optional['WorkerPool']], None
+        ] = None,
+        coalesce: bool = False,
     ) -> None:
+        """
+        params:
+            pool: if given, the target runs in one of the pool's workers
+                instead of a new os thread. `daemon` is ignored in this case.
+                it can also be a function which returns the pool (or None),
+                which is called at each run, so the thread follows the pool
+                being replaced.
+            coalesce: see `add_task`.
+        """
         self.on_complete = Signal()
+        self._coalesce = coalesce
         self._daemon = daemon
+        self._future = Future()
         self._illed = None  # DELETE?
         self._interruptible = interruptible
         self._is_executed = False
         self._is_running = False
+        self._lock = RLock()  # reentrant for the callbacks of `future`.
+        self._pool = pool
+        self._reporter: t.Optional[
+            t.Callable[[Thread, t.Optional[float], t.Optional[BaseException]],
+                       t.Any]
+        ] = None  # set by `ThreadManager`, called after each task.
         self._result = Thread.Undefined
-        self._target = (target, args, kwargs)
+        self._target = (target, args or (), kwargs or {})
+        self._tasks: t.Deque[t.Tuple[T.Args, T.KwArgs, FrameType]] = deque()
         self._thread: t.Optional[_Thread] = None
         if start_now:
             self.mainloop()
@@ -61,6 +94,17 @@ class Thread:
     def interruptible(self) -> bool:
         return self._interruptible
     
+    @property
+    def future(self) -> Future:
+        """
+        a `concurrent.futures.Future` of the current run, it is resolved with
+        the result (or the exception) of the target, or the last task if
+        there are queued tasks.
+        use it with `concurrent.futures.wait`, `as_completed` or
+        `asyncio.wrap_future`.
+        """
+        return self._future
+    
     @property
     def is_running(self) -> bool:
         return self._is_running
@@ -94,87 +138,288 @@ class Thread:
     
     def mainloop(self) -> None:
         self._is_running = True
-        
-        def _handle(main_caller_frame: FrameType) -> None:
-            func, args, kwargs = self._target
-            try:
-                self._result = func(*args, **kwargs)
-            except Exception as e:
-                self._illed = e
+        self._is_executed = True
+        if self._future.done():
+            self._future = Future()
+        _frame = inspect.currentframe()
+        pool = self._pool() if callable(self._pool) else self._pool
+        if pool:
+            pool.submit(self._handle, _frame)
+        else:
+            self._thread = _Thread(target=self._handle, args=(_frame,))
+            self._thread.daemon = self._daemon
+            self._thread.start()
+    
+    def add_task(self, args: T.Args = None, kwargs: T.KwArgs = None) -> None:
+        """
+        run the target again with new arguments, after the current run (and
+        the other pending tasks) is done. if the thread is idle, it is
+        restarted.
+        if the thread is coalescing, the pending tasks are dropped and only
+        the latest one is kept.
+        """
+        task = (args or (), kwargs or {}, inspect.currentframe())
+        with self._lock:
+            if self._is_running:
+                if self._coalesce:
+                    self._tasks.clear()
+                self._tasks.append(task)
+                return
+            self._target = (self._target[0], *task[:2])
+            self._is_running = True
+        self.mainloop()
+    
+    def _handle(self, main_caller_frame: FrameType) -> None:
+        future = self._future
+        if not future.set_running_or_notify_cancel():
+            # cancelled by `self.future.cancel()` while waiting in the pool.
+            with self._lock:
+                self._tasks.clear()
                 self._is_running = False
-                self._result = Thread.BrokenResult(e)
+            if self._reporter:
+                self._reporter(self, None, None)
+            return
+        while True:
+            start = time()
+            try:
+                self._run(main_caller_frame)
+                error = None
+            except BaseException as e:
+                error = e
+            duration = time() - start
+            with self._lock:
+                if self._tasks and self._is_running:
+                    args, kwargs, main_caller_frame = self._tasks.popleft()
+                    self._target = (self._target[0], args, kwargs)
+                    finished = False
+                else:
+                    self._tasks.clear()
+                    self._is_running = False
+                    # resolve it inside the lock, so that a restart by
+                    # `add_task` always gets a new future.
+                    if error:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(self._result)
+                    finished = True
+            if self._reporter:
+                self._reporter(self, duration, error)
+            if finished:
+                break
+            if error:
+                print(':e', error)
+        if error:
+            raise error
+    
+    def _run(self, main_caller_frame: FrameType) -> None:
+        func, args, kwargs = self._target
+        try:
+            self._result = func(*args, **kwargs)
+        except Exception as e:
+            self._illed = e
+            self._result = Thread.BrokenResult(e)
+            
+            # https://gemini.google.com/share/7cff088615cb
+            stack = []
+            frame = main_caller_frame
+            while frame:
+                info = inspect.getframeinfo(frame)
+                stack.append('file "{}:{}" at "{}"'.format(
+                    info.filename, info.lineno, info.function
+                ))
+                frame = frame.f_back
+            print(':dv8')
+            print(
+                'an exception occured in a thread processing, here is its '
+                'caller stack trace:', ':v8'
+            )
+            for i, line in enumerate(reversed(stack)):
+                print('    {}. {}'.format(i, line), ':v8s1')
                 
-                # https://gemini.google.com/share/7cff088615cb
-                stack = []
-                frame = main_caller_frame
-                while frame:
-                    info = inspect.getframeinfo(frame)
-                    stack.append('file "{}:{}" at "{}"'.format(
-                        info.filename, info.lineno, info.function
-                    ))
-                    frame = frame.f_back
-                print(':dv8')
-                print(
-                    'an exception occured in a thread processing, here is its '
-                    'caller stack trace:', ':v8'
+            raise e
+        if self._interruptible:
+            # https://stackoverflow.com/questions/6416538
+            if isinstance(self._result, GeneratorType):
+                for _ in self._result:
+                    if not self._is_running:
+                        # a safe "break signal" emitted from the outside.
+                        print('thread is safely killed', func, ':v7')
+                        break
+            else:
+                raise Exception(
+                    'thread is marked interruptible but there is no break '
+                    'point in the function', func,
                 )
-                for i, line in enumerate(reversed(stack)):
-                    print('    {}. {}'.format(i, line), ':v8s1')
-                    
-                raise e
-            if self._interruptible:
-                # https://stackoverflow.com/questions/6416538
-                if isinstance(self._result, GeneratorType):
-                    for _ in self._result:
-                        if not self._is_running:
-                            # a safe "break signal" emitted from the outside.
-                            print('thread is safely killed', func, ':v7')
-                            break
-                else:
-                    raise Exception(
-                        'thread is marked interruptible but there is no break '
-                        'point in the function', func,
-                    )
-            self.on_complete.emit(self._result)
-            self._is_running = False
-        
-        _frame = inspect.currentframe()
-        self._thread = _Thread(target=_handle, args=(_frame,))
-        self._thread.daemon = self._daemon
-        self._thread.start()
-        self._is_executed = True
+        self.on_complete.emit(self._result)
     
-    def join(self, timeout: t.Optional[float] = 10e-3) -> T.Result:
+    def join(
+        self,
+        timeout: t.Optional[float] = None,
+        *,
+        max_wait: t.Optional[float] = None,
+    ) -> T.Result:
         """
+        block until the thread finished. the waiting can be broken by
+        `ctrl + c`, see `_wait_future`.
+        
         params:
-            timeout: None | float
-                None: blocking until thread finished.
-                    warning: the thread won't listen to KeyboardInterrupt
-                    signal, it means you may never stop it if the thread is run
-                    into a dead loop.
-                float:
-                    blocking until thread finished or user presses `ctrl + c`.
-                    ref: https://stackoverflow.com/a/3788243/9695911
+            timeout: deprecated, it was the polling interval of waiting, and
+                is ignored now.
+            max_wait: if set, raise TimeoutError if the thread is not finished
+                in `max_wait` seconds.
         """
+        if timeout is not None:
+            print(
+                ':v6',
+                'deprecation warning: `Thread.join(timeout)` no longer polls, '
+                'the timeout is ignored. use `max_wait` to limit the waiting.'
+            )
         if not self._is_executed:
             raise Exception('thread is never started!')
         if self._is_running:
-            if timeout is None:
-                self._thread.join()
-            else:
-                while True:
-                    self._thread.join(timeout)
-                    if not self._thread.is_alive():
-                        break
+            if not _wait_future(self._future, max_wait):
+                raise TimeoutError(
+                    'thread is not finished in {}s'.format(max_wait)
+                )
             assert self._is_running is False
         return self.result
 
 
+class WorkerPool:
+    """
+    a bounded pool of worker threads.
+    workers are started lazily, up to `max_workers`, and are reused for the
+    following tasks. if `max_queue` is positive, `submit` blocks while there
+    are already `max_queue` tasks waiting, which gives backpressure to the
+    producer.
+    """
+    
+    def __init__(
+        self,
+        max_workers: int = None,
+        max_queue: int = 0,
+        daemon: bool = True,
+    ) -> None:
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self._daemon = daemon
+        self._idle = Semaphore(0)
+        self._lock = Lock()
+        self._queue = Queue(max_queue)
+        self._shutdown = False
+        self._workers: t.List[_Thread] = []
+    
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+    
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+    
+    def submit(self, func: t.Callable, *args, **kwargs) -> Future:
+        if self._shutdown:
+            raise RuntimeError('cannot submit task to a shut down pool')
+        future = Future()
+        self._queue.put((future, func, args, kwargs))
+        self._adjust()
+        return future
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        stop the workers after they finish the queued tasks.
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            workers = tuple(self._workers)
+        for _ in workers:
+            self._queue.put(None)
+        if wait:
+            for w in workers:
+                w.join()
+    
+    def _adjust(self) -> None:
+        if self._idle.acquire(timeout=0):
+            return
+        with self._lock:
+            if len(self._workers) < self.max_workers:
+                w = _Thread(target=self._work, daemon=self._daemon)
+                self._workers.append(w)
+                w.start()
+    
+    def _work(self) -> None:
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            future, func, args, kwargs = task
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+                    print(':e', e)
+            del task, future, func, args, kwargs
+            self._idle.release()
+
+
 class ThreadManager:
+    """
+    finished threads are evicted from `thread_pool`, except the latest
+    `retention` ones of each group, so that a long-running process does not
+    keep every thread and its result forever.
+    """
+    
+    retention: int
     thread_pool: T.ThreadPool
+    _finished: t.Dict[T.Group, t.Deque[t.Tuple[T.Id, Thread]]]
+    _live: t.Dict[T.Group, t.Set[Thread]]
+    _pools: t.Dict[T.Group, WorkerPool]
+    _stats: t.Dict[T.Group, t.List[t.Union[int, float]]]
+    #   {group: [finished_count, failed_count, total_time], ...}
     
-    def __init__(self) -> None:
+    def __init__(self, retention: int = 0) -> None:
+        self.retention = retention
         self.thread_pool = defaultdict(dict)
+        self._finished = defaultdict(deque)
+        self._live = defaultdict(set)
+        self._lock = Lock()
+        self._pools = {}
+        self._stats = defaultdict(lambda: [0, 0, 0.0])
+    
+    def set_pool(
+        self,
+        group: T.Group = 'default',
+        max_workers: t.Optional[int] = None,
+        max_queue: int = 0,
+    ) -> t.Optional[WorkerPool]:
+        """
+        run the threads of a group in a bounded worker pool, instead of
+        creating a new os thread for each call.
+        
+        params:
+            max_workers: the max count of worker threads. if 0, the pool of
+                the group is removed, the following calls go back to the
+                one-thread-per-call mode.
+                if None, it is `min(32, cpu_count + 4)`.
+            max_queue: the max count of pending calls. if the queue is full,
+                calling a `new_thread` decorated function blocks until a
+                worker is free. 0 means no limit.
+        
+        the existing threads of the group (e.g. singletons) run their next
+        tasks in the new pool. the old pool finishes its queued tasks in the
+        background.
+        
+        note: the long-running threads of lk_utils itself (process watcher,
+        output readers, background activities) are in the "lk_utils" group.
+        """
+        if old := self._pools.pop(group, None):
+            old.shutdown(wait=False)
+        if max_workers == 0:
+            return None
+        pool = self._pools[group] = WorkerPool(max_workers, max_queue)
+        return pool
     
     def new_thread(
         self,
@@ -183,8 +428,20 @@ class ThreadManager:
         daemon: bool = True,
         singleton: bool = False,
         interruptible: bool = False,
+        coalesce: bool = False,
     ) -> t.Callable[[T.Target], t.Callable[[t.Any], Thread]]:
-        """a decorator wraps target function in a new thread."""
+        """
+        a decorator wraps target function in a new thread.
+        
+        params:
+            singleton: if true, there is at most one running thread for the
+                function. the calls during its running are queued and
+                processed one by one in the same thread.
+            coalesce: only works with `singleton`. if true, the queued calls
+                are replaced by the latest one ("latest wins"). this is
+                useful for debounced tasks, like saving a file or rebuilding
+                an index.
+        """
         
         def decorator(func: T.Target) -> t.Callable[[t.Any], Thread]:
             nonlocal ident
@@ -202,6 +459,7 @@ class ThreadManager:
                     daemon,
                     singleton,
                     interruptible,
+                    coalesce,
                 )
             
             return wrapper
@@ -215,6 +473,7 @@ class ThreadManager:
         daemon: bool = True,
         singleton: bool = False,
         interruptible: bool = None,
+        coalesce: bool = False,
         **kwargs
     ) -> Thread:
         """run function in a new thread at once."""
@@ -234,7 +493,8 @@ class ThreadManager:
             kwargs,
             daemon,
             singleton,
-            interruptible
+            interruptible,
+            coalesce,
         )
     
     def _create_thread(
@@ -247,18 +507,99 @@ class ThreadManager:
         daemon: bool = True,
         singleton: bool = False,
         interruptible: bool = False,
+        coalesce: bool = False,
     ) -> Thread:
         if singleton:
-            if t := self.thread_pool[group].get(ident):
-                t.add_task(args, kwargs)
-                return t
-        out = self.thread_pool[group][ident] = Thread(
+            # note: `Thread.__bool__` is false for a finished thread, but we
+            # still reuse it, `add_task` restarts it.
+            with self._lock:
+                if (thread := self.thread_pool[group].get(ident)) is not None:
+                    self._live[group].add(thread)
+            if thread is not None:
+                thread.add_task(args, kwargs)
+                return thread
+        out = Thread(
             target=target,
             args=args,
             kwargs=kwargs,
             daemon=daemon,
             interruptible=interruptible,
+            start_now=False,
+            pool=partial(self._pools.get, group),
+            coalesce=coalesce,
         )
+        out._reporter = partial(self._on_task_done, group, ident)
+        with self._lock:
+            self.thread_pool[group][ident] = out
+            self._live[group].add(out)
+        out.start()
+        return out
+    
+    def _on_task_done(
+        self,
+        group: T.Group,
+        ident: T.Id,
+        thread: Thread,
+        duration: t.Optional[float],
+        error: t.Optional[BaseException],
+    ) -> None:
+        with self._lock:
+            if duration is not None:
+                stats = self._stats[group]
+                stats[0] += 1
+                stats[1] += error is not None
+                stats[2] += duration
+            if thread.is_running:
+                return
+            self._live[group].discard(thread)
+            finished = self._finished[group]
+            if (ident, thread) in finished:  # a reused singleton.
+                finished.remove((ident, thread))
+            finished.append((ident, thread))
+            while len(finished) > self.retention:
+                ident, thread = finished.popleft()
+                pool = self.thread_pool[group]
+                # the ident may have been taken by a newer thread.
+                if pool.get(ident) is thread and not thread.is_running:
+                    del pool[ident]
+                    if not pool:
+                        del self.thread_pool[group]
+    
+    def stats(self, group: T.Group = None) -> t.Dict[T.Group, dict]:
+        """
+        returns:
+            {group: {
+                'active': int, running threads.
+                'queued': int, threads waiting for a worker of the pool, plus
+                    the pending tasks of singleton threads.
+                'finished': int, finished tasks, including the failed ones.
+                'failed': int,
+                'avg_time': float, average run time of the finished tasks,
+                    in seconds.
+            }, ...}
+        """
+        out = {}
+        with self._lock:
+            if group is None:
+                groups = {*self._live, *self._stats}
+            else:
+                groups = (group,)
+            for g in groups:
+                active = queued = 0
+                for thread in self._live.get(g, ()):
+                    if thread.future.running():
+                        active += 1
+                    elif thread.is_running:
+                        queued += 1
+                    queued += len(thread._tasks)
+                finished, failed, total_time = self._stats.get(g, (0, 0, 0))
+                out[g] = {
+                    'active': active,
+                    'queued': queued,
+                    'finished': finished,
+                    'failed': failed,
+                    'avg_time': total_time / finished if finished else 0.0,
+                }
         return out
     
     # -------------------------------------------------------------------------
@@ -291,7 +632,30 @@ class ThreadManager:
         return ThreadManager.Delegate(*self.thread_pool[group].values())
 
 
+def _wait_future(future: Future, timeout: t.Optional[float] = None) -> bool:
+    """
+    block until the future is done, return False if timeout.
+    on posix, a blocking wait is interrupted by `ctrl + c` directly. on
+    windows it is not, so we wake up every second to give the main thread a
+    chance to raise KeyboardInterrupt.
+    ref: https://stackoverflow.com/a/3788243/9695911
+    """
+    if sys.platform != 'win32':
+        return bool(wait_futures((future,), timeout).done)
+    deadline = None if timeout is None else time() + timeout
+    while True:
+        if deadline is None:
+            wait_time = 1
+        else:
+            wait_time = max(0, min(1, deadline - time()))
+        if wait_futures((future,), wait_time).done:
+            return True
+        if deadline is not None and time() >= deadline:
+            return False
+
+
 thread_manager = ThreadManager()
 new_thread = thread_manager.new_thread
 run_new_thread = thread_manager.run_new_thread
 retrieve_thread = thread_manager.retrieve_thread
+set_thread_pool = thread_manager.set_pool
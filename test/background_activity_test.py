@@ -0,0 +1,212 @@
+from functools import partial
+from threading import Event
+from time import perf_counter
+from time import process_time
+from time import sleep
+
+from argsense import cli
+
+from lk_utils.subproc import bg
+
+
+@cli.cmd()
+def latency(rounds: int = 5) -> None:
+    """
+    the time from registering an activity to its first step. the loop may be
+    idle (blocked on a delay) or stopped (no activity) before.
+    """
+    def ticker():
+        while True:
+            yield bg.delay(10)
+
+    keeper = bg.register_activity(ticker).start()
+    for i in range(rounds):
+        started = Event()
+
+        def task():
+            started.set()
+            yield
+
+        start = perf_counter()
+        bg.register_activity(task, 'task_{}'.format(i)).start()
+        started.wait(5)
+        print('first step after {:.2f}ms'.format((perf_counter() - start) * 1000))
+    keeper.cancel()
+
+
+@cli.cmd()
+def throughput(steps: int = 10000) -> None:
+    done = Event()
+
+    def task():
+        for _ in range(steps):
+            yield bg.delay(0)  # opt out of the loop's schedule.
+        done.set()
+
+    start = perf_counter()
+    bg.register_activity(task).start()
+    done.wait(60)
+    print('{:.0f} steps/s'.format(steps / (perf_counter() - start)))
+
+
+@cli.cmd()
+def pacing(seconds: float = 2) -> None:
+    """
+    a bare `yield` follows the loop's schedule, it must not spin.
+    """
+    steps = []
+
+    def task():
+        while True:
+            steps.append(perf_counter())
+            yield
+
+    start = process_time()
+    act = bg.register_activity(task).start()
+    sleep(seconds)
+    act.cancel()
+    cpu = process_time() - start
+    print('{} steps, cpu time {:.3f}s in {}s'.format(len(steps), cpu, seconds))
+    assert len(steps) <= seconds / bg.interval + 2, len(steps)
+    assert cpu < seconds / 4, cpu
+
+
+@cli.cmd()
+def delay(sec: float = 0.05, count: int = 10) -> None:
+    oversleep = []
+    done = Event()
+
+    def task():
+        for _ in range(count):
+            start = perf_counter()
+            yield bg.delay(sec)
+            oversleep.append(perf_counter() - start - sec)
+        done.set()
+
+    bg.register_activity(task).start()
+    done.wait(60)
+    print('average oversleep {:.2f}ms, max {:.2f}ms'.format(
+        sum(oversleep) / count * 1000, max(oversleep) * 1000
+    ))
+
+
+@cli.cmd()
+def suspending() -> None:
+    steps = []
+
+    def task():
+        while True:
+            steps.append(perf_counter())
+            yield bg.delay(0.01)
+
+    act = bg.register_activity(task).start()
+    sleep(0.1)
+    with bg.suspending():
+        start = perf_counter()
+        sleep(0.2)
+        assert not [x for x in steps if x > start], 'activity is not suspended'
+    sleep(0.1)
+    assert steps[-1] > start + 0.2, 'activity is not resumed'
+    act.cancel()
+
+
+@cli.cmd()
+def periodic(seconds: float = 1.05) -> None:
+    """
+    a slow activity (0.25s per run, every 0.1s) under each missed-run policy,
+    and a fast one which should keep its cadence beside them.
+    """
+    runs = {}
+    ticks = []
+
+    def slow(policy: str):
+        runs[policy] = runs.get(policy, 0) + 1
+        sleep(0.25)
+
+    def fast():
+        ticks.append(perf_counter())
+
+    acts = [
+        bg.register_activity(
+            partial(slow, policy), policy, every=0.1, missed=policy
+        ).start()
+        for policy in ('skip', 'catch-up', 'coalesce')
+    ]
+    acts.append(bg.register_activity(fast, every=0.05).start())
+    sleep(seconds)
+    for act in acts:
+        print(act, 'pending:', act._schedule.pending)
+        act.cancel()
+    print(runs)
+    gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+    print('fast activity: {} runs, interval {:.1f}~{:.1f}ms'.format(
+        len(ticks), min(gaps) * 1000, max(gaps) * 1000
+    ))
+    assert runs['skip'] == 4, runs
+    assert acts[1]._schedule.pending > 0  # catch-up keeps the backlog.
+    assert acts[2]._schedule.pending <= 1
+
+
+@cli.cmd()
+def cancel() -> None:
+    act = bg.register_activity(lambda: None, every=10).start()
+    sleep(0.1)
+    assert bg._timer, 'the next tick is not scheduled'
+    act.cancel()
+    # removed at once, not at its next tick.
+    assert not bg._activities and not bg._timer and not bg._deadlines
+    sleep(0.1)
+    assert not bg._looping, 'the loop does not quit'
+
+
+@cli.cmd()
+def same_task() -> None:
+    runs = {}
+
+    def check_health(url: str) -> None:
+        runs[url] = runs.get(url, 0) + 1
+
+    a = bg.register_activity(check_health, every=0.05).start('http://a')
+    b = bg.register_activity(check_health, every=0.05).start('http://b')
+    sleep(0.3)
+    a.cancel()
+    count = runs.get('http://a', 0)
+    sleep(0.2)
+    b.cancel()
+    print(runs)
+    assert count > 0 and runs['http://b'] > 0, runs
+    assert runs['http://a'] == count, 'cancelled activity still runs'
+    assert runs['http://b'] > count, runs
+
+@cli.cmd()
+def suspended_ticks(every: float = 0.05, pause: float = 1) -> None:
+    runs = []
+
+    def task():
+        runs.append(perf_counter())
+
+    act = bg.register_activity(task, every=every, missed='catch-up').start()
+    sleep(0.2)
+    with bg.suspending():
+        sleep(pause)
+        resume = perf_counter()
+    sleep(0.2)
+    act.cancel()
+    burst = [x for x in runs if resume <= x < resume + every / 2]
+    print('{} runs, {} right after resuming'.format(len(runs), len(burst)))
+    # the ticks during the suspension (pause / every) are not caught up.
+    assert len(burst) <= 2, burst
+    assert len(runs) <= (0.4 + 0.1) / every + 2, len(runs)
+
+
+if __name__ == '__main__':
+    # pox test/background_activity_test.py latency
+    # pox test/background_activity_test.py throughput
+    # pox test/background_activity_test.py pacing
+    # pox test/background_activity_test.py delay
+    # pox test/background_activity_test.py suspending
+    # pox test/background_activity_test.py periodic
+    # pox test/background_activity_test.py cancel
+    # pox test/background_activity_test.py same-task
+    # pox test/background_activity_test.py suspended-ticks
+    cli.run()
@@ -0,0 +1,173 @@
+import asyncio
+from time import perf_counter
+from time import process_time
+from time import sleep
+from time import time
+
+from argsense import cli
+
+from lk_utils import coro
+
+
+@cli.cmd()
+def sleeping_tasks(count: int = 200, naps: int = 5) -> None:
+    """
+    many tasks sleep at the same time, check the oversleep of each nap.
+    """
+    oversleep = []
+
+    def nap(sec: float):
+        for _ in range(naps):
+            start = time()
+            yield coro.sleep(sec)
+            oversleep.append(time() - start - sec)
+
+    start = time()
+    for i in range(count):
+        coro('nap_{}'.format(i))(nap)(0.05)
+    coro.join_all()
+    print(
+        '{} tasks done in {:.3f}s, average oversleep {:.2f}ms, max {:.2f}ms'
+        .format(
+            count,
+            time() - start,
+            sum(oversleep) / len(oversleep) * 1000,
+            max(oversleep) * 1000,
+        )
+    )
+
+
+@cli.cmd()
+def gather(count: int = 500) -> None:
+    """
+    fan-in over many tasks, the waiting side should not burn cpu.
+    """
+    def nap(x: int):
+        yield coro.sleep(0.5)
+        yield x
+
+    tasks = [coro('gather_{}'.format(i))(nap)(i) for i in range(count)]
+    start = process_time()
+    results = coro.gather(*tasks)
+    # the cpu time includes the scheduler thread.
+    print('gathered in cpu time {:.3f}s'.format(process_time() - start))
+    assert results == list(range(count)), results[:3]
+
+    for task in tasks:
+        task(0)
+    try:
+        coro.gather(*tasks, timeout=0.1)
+    except TimeoutError as e:
+        print('timeout as expected:', e)
+    else:
+        raise AssertionError('timeout is not raised')
+    coro.join_all()
+
+
+@cli.cmd()
+def awaitable() -> None:
+    def countdown(n: int):
+        for i in range(n):
+            yield coro.sleep(0.01)
+        yield n
+
+    @coro('broken')
+    def broken():
+        yield coro.sleep(0.01)
+        raise ValueError('broken')
+
+    async def main() -> None:
+        a = coro('a')(countdown)(3)
+        b = coro('b')(countdown)(5)
+        assert await asyncio.gather(a, b) == [3, 5]
+        try:
+            await broken()
+        except ValueError as e:
+            print('error raised in await:', repr(e))
+        else:
+            raise AssertionError('error is not raised')
+
+    asyncio.run(main())
+
+
+@cli.cmd()
+def workers(count: int = 2) -> None:
+    """
+    a task blocks its worker for a while, check the max stall of another
+    task. with 2+ workers, the stall should be close to the tick.
+    """
+    coro.set_workers(count)
+    gaps = []
+
+    def blocking():
+        yield coro.sleep(0.05)
+        sleep(0.5)  # a slow step, not yielding.
+
+    def ticking():
+        last = time()
+        for _ in range(50):
+            yield coro.sleep(0.01)
+            gaps.append(time() - last - 0.01)
+            last = time()
+
+    coro('blocking', affinity=0)(blocking)()
+    coro('ticking', affinity=1)(ticking)()
+    coro.join_all()
+    print('{} workers, max stall of ticking task: {:.1f}ms'.format(
+        count, max(gaps) * 1000
+    ))
+
+
+@cli.cmd()
+def fairness(seconds: float = 1) -> None:
+    """
+    two busy tasks never pause, the one with priority 1 should get about
+    twice the cpu time of the other, and a ticking task still gets its turn
+    within a time slice.
+    """
+    gaps = []
+
+    def busy():
+        while True:
+            end = perf_counter() + 1e-3
+            while perf_counter() < end:
+                pass
+            yield 0
+
+    def ticking():
+        last = time()
+        for _ in range(int(seconds / 0.05)):
+            yield coro.sleep(0.05)
+            gaps.append(time() - last - 0.05)
+            last = time()
+
+    hogs = (coro('busy_0')(busy)(), coro('busy_1', priority=1)(busy)())
+    coro('ticking')(ticking)()
+    sleep(seconds)
+    for task in hogs:
+        coro.cancel(task)
+    coro.join_all()
+    for name, stats in coro.stats().items():
+        print(name, stats)
+    print('max stall of ticking task: {:.1f}ms'.format(max(gaps) * 1000))
+    stats = coro.stats()
+    ratio = stats['busy_1']['cpu_time'] / stats['busy_0']['cpu_time']
+    assert 1.5 < ratio < 2.5, ratio
+
+
+@cli.cmd()
+def idle_cpu(seconds: float = 2) -> None:
+    start = process_time()
+    sleep(seconds)
+    print('cpu time when idle: {:.3f}s'.format(process_time() - start))
+
+
+if __name__ == '__main__':
+    # pox test/coroutine_scheduler_test.py sleeping-tasks
+    # pox test/coroutine_scheduler_test.py gather
+    # pox test/coroutine_scheduler_test.py awaitable
+    # pox test/coroutine_scheduler_test.py workers
+    # pox test/coroutine_scheduler_test.py workers --count 1
+    # pox test/coroutine_scheduler_test.py fairness
+    # pox test/coroutine_scheduler_test.py idle-cpu
+    cli.run()
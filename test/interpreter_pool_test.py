@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+from time import sleep
+from time import time
+
+from argsense import cli
+
+from lk_utils import subproc as sp
+
+
+@cli.cmd()
+def main(times: int = 5) -> None:
+    """
+    run this file's `job` command in cold interpreters and warm interpreters,
+    compare the average latency.
+    """
+    cold = 0.0
+    for i in range(times):
+        start = time()
+        out = sp.run_cmd_args(sys.executable, __file__, 'job', i)
+        cold += time() - start
+        assert out == 'job {}'.format(i), out
+
+    warm = 0.0
+    with sp.InterpreterPool(size=2, preload=('argsense', 'lk_utils')) as pool:
+        for i in range(times):
+            sleep(1)  # give the pool time to warm up.
+            start = time()
+            out = pool.run(__file__, 'job', i)
+            warm += time() - start
+            assert out == 'job {}'.format(i), out
+
+    print(
+        'cold: {:.3f}s, warm: {:.3f}s per call'.format(
+            cold / times, warm / times
+        )
+    )
+
+
+@cli.cmd()
+def caller_state() -> None:
+    """
+    the job sees the caller's current cwd and environment, not the ones when
+    the worker was started.
+    """
+    script = 'import os; print(os.getcwd(), os.getenv("LK_IPOOL_TEST"))'
+    origin = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            with sp.InterpreterPool(size=1) as pool:
+                sleep(0.5)
+                os.mkdir('b')
+                os.chdir('b')
+                os.environ['LK_IPOOL_TEST'] = 'bar'
+                expected = sp.run_cmd_args(sys.executable, '-c', script)
+                with open('job.py', 'w') as f:
+                    f.write(script)
+                out = pool.run('job.py')
+                assert out == expected, (out, expected)
+                del os.environ['LK_IPOOL_TEST']
+                out = pool.run('job.py', env={'LK_IPOOL_TEST': 'baz'})
+                assert out.endswith(' baz'), out
+        finally:
+            os.chdir(origin)
+            os.environ.pop('LK_IPOOL_TEST', None)
+    print('the job follows the caller:', expected)
+
+
+@cli.cmd()
+def job(index: int) -> None:
+    sys.stdout.write('job {}\n'.format(index))
+
+
+if __name__ == '__main__':
+    # pox test/interpreter_pool_test.py main
+    # pox test/interpreter_pool_test.py caller-state
+    cli.run()
@@ -0,0 +1,60 @@
+"""
+measure the import time of lk_utils, the count of threads right after
+importing, and the cpu time the process burns when idle.
+to compare with another version, pass its source root by `repo`, e.g. a
+`git worktree` of an older commit.
+"""
+import json
+import os
+import subprocess as sp
+import sys
+
+from argsense import cli
+
+_CHILD = '''
+import json, sys, threading, time
+start = time.perf_counter()
+import lk_utils
+import_time = time.perf_counter() - start
+threads = threading.active_count()
+cpu_start = time.process_time()
+time.sleep({seconds})
+sys.stdout.write(json.dumps({{
+    'import_time': import_time,
+    'threads': threads,
+    'idle_cpu': time.process_time() - cpu_start,
+}}) + '\\n')
+'''
+
+
+@cli.cmd()
+def main(seconds: float = 3, repo: str = '', rounds: int = 3) -> None:
+    repo = os.path.abspath(repo or os.path.dirname(os.path.dirname(__file__)))
+    env = {**os.environ, 'PYTHONPATH': repo}
+    results = []
+    for _ in range(rounds):
+        out = sp.run(
+            (sys.executable, '-c', _CHILD.format(seconds=seconds)),
+            capture_output=True,
+            check=True,
+            cwd=repo,
+            env=env,
+            text=True,
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    print(repo)
+    print(
+        'import time: {:.1f}ms, threads after import: {}, '
+        'idle cpu in {}s: {:.1f}ms'.format(
+            min(x['import_time'] for x in results) * 1000,
+            results[0]['threads'],
+            seconds,
+            sum(x['idle_cpu'] for x in results) / rounds * 1000,
+        )
+    )
+
+
+if __name__ == '__main__':
+    # pox test/lazy_loops_benchmark.py main
+    # pox test/lazy_loops_benchmark.py main --repo <older_worktree>
+    cli.run()
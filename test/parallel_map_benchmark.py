@@ -0,0 +1,73 @@
+"""
+compare `parallel_map` with the common "one `run_new_thread` per item"
+pattern, on an io bound task (sleep) and a cpu bound task (hash loop).
+"""
+import hashlib
+from time import perf_counter
+from time import sleep
+
+from argsense import cli
+
+from lk_utils import parallel_imap
+from lk_utils import parallel_map
+from lk_utils import run_new_thread
+
+
+def io_task(x: int) -> int:
+    sleep(1e-3)
+    return x
+
+
+def cpu_task(x: int) -> int:
+    data = str(x).encode()
+    for _ in range(2000):
+        data = hashlib.sha256(data).digest()
+    return data[0]
+
+
+def _naive_map(func, items) -> list:
+    threads = [run_new_thread(func, x) for x in items]
+    return [x.join() for x in threads]
+
+
+@cli.cmd()
+def main(count: int = 2000, workers: int = 32) -> None:
+    items = range(count)
+    for task in (io_task, cpu_task):
+        expected = list(map(task, items[:10]))
+        for name, run in (
+            ('serial', lambda: list(map(task, items))),
+            ('run_new_thread per item', lambda: _naive_map(task, items)),
+            ('parallel_map thread', lambda: parallel_map(
+                task, items, workers
+            )),
+            ('parallel_map process', lambda: parallel_map(
+                task, items, backend='process'
+            )),
+        ):
+            start = perf_counter()
+            results = run()
+            duration = perf_counter() - start
+            assert results[:10] == expected, name
+            print(
+                '{:<10} {:<24} {:>8.3f}s'.format(task.__name__, name, duration),
+                ':s1',
+            )
+
+
+@cli.cmd()
+def unordered(count: int = 16) -> None:
+    def task(x: int) -> int:
+        sleep(0.2 if x == 0 else 0.01)  # the head is slow.
+        return x
+
+    start = perf_counter()
+    first = next(parallel_imap(task, range(count), 4, ordered=False))
+    print('first result {} after {:.3f}s'.format(first, perf_counter() - start))
+    assert first != 0
+
+
+if __name__ == '__main__':
+    # pox test/parallel_map_benchmark.py main
+    # pox test/parallel_map_benchmark.py unordered
+    cli.run()
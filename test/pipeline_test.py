@@ -0,0 +1,89 @@
+import threading
+from time import process_time
+from time import sleep
+
+from argsense import cli
+
+from lk_utils.subproc import Pipeline
+from lk_utils.subproc import thread_manager
+
+
+def explode(x: int):
+    for i in range(3):
+        yield x, i
+
+
+def slow_echo(x):
+    sleep(1e-3)
+    return x
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+def slow_source(count: int):
+    for i in range(count):
+        sleep(0.1)
+        yield i
+
+
+@cli.cmd()
+def main(count: int = 100) -> None:
+    out = Pipeline(4).add(explode).add(slow_echo, workers=4).run(range(count))
+    assert sorted(out) == [(x, i) for x in range(count) for i in range(3)]
+    # the workers and the feeder are managed by `thread_manager`.
+    stats = thread_manager.stats('lk_utils')['lk_utils']
+    assert stats['finished'] >= 6, stats
+
+    out = Pipeline(4).add(square, workers=2, backend='process').run(
+        range(count)
+    )
+    assert sorted(out) == [x * x for x in range(count)]
+
+
+@cli.cmd()
+def error() -> None:
+    def fail_at_50(x: int) -> int:
+        if x == 50:
+            raise ValueError(x)
+        return x
+
+    try:
+        Pipeline(2).add(fail_at_50, workers=3).add(slow_echo).run(
+            range(10**9)
+        )
+    except ValueError as e:
+        print('error propagated', repr(e))
+    else:
+        raise AssertionError('error is not propagated')
+
+
+@cli.cmd()
+def idle() -> None:
+    # the stages wait for a slow source without polling.
+    start = process_time()
+    out = Pipeline(2).add(square, workers=4).add(slow_echo).run(
+        slow_source(10)
+    )
+    assert out == [x * x for x in range(10)]
+    print('cpu time: {:.1f}ms'.format((process_time() - start) * 1000))
+    assert process_time() - start < 0.05
+
+
+@cli.cmd()
+def early_exit() -> None:
+    before = threading.active_count()
+    for x in Pipeline(2).add(slow_echo, workers=2).stream(iter(range(10**9))):
+        if x == 10:
+            break
+    sleep(0.3)
+    assert threading.active_count() == before, 'workers are not stopped'
+
+
+if __name__ == '__main__':
+    # pox test/pipeline_test.py main
+    # pox test/pipeline_test.py error
+    # pox test/pipeline_test.py idle
+    # pox test/pipeline_test.py early-exit
+    cli.run()
@@ -0,0 +1,55 @@
+import hashlib
+import os
+from array import array
+from time import time
+
+from argsense import cli
+
+from lk_utils import subproc as sp
+
+
+@sp.new_process(pool=True)
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def double(data: bytes) -> bytes:
+    return data + data
+
+
+def fail(x: int) -> None:
+    raise ValueError(x)
+
+
+@cli.cmd()
+def main(start_method: str = 'spawn', size_mb: int = 32) -> None:
+    data = os.urandom(size_mb * 1024 * 1024)
+    with sp.ProcessPool(2, start_method) as pool:
+        start = time()
+        assert pool.submit(double, data).result() == data * 2
+        print('double {}MB: {:.3f}s'.format(size_mb, time() - start))
+
+        numbers = array('d', range(300_000))
+        assert pool.submit(double, numbers).result() == numbers + numbers
+
+        # builtin methods have no usable `__module__`.
+        assert pool.submit(str.upper, 'a').result() == 'A'
+        assert pool.submit('a-b'.split, '-').result() == ['a', 'b']
+
+        try:
+            pool.submit(fail, 3).result()
+        except ValueError as e:
+            print('exception propagated', repr(e))
+        else:
+            raise AssertionError('exception is not propagated')
+
+    assert digest(data).result() == hashlib.sha256(data).hexdigest()
+    if os.path.isdir('/dev/shm'):
+        leaked = [x for x in os.listdir('/dev/shm') if x.startswith('psm_')]
+        assert not leaked, leaked
+
+
+if __name__ == '__main__':
+    # pox test/process_pool_test.py main
+    # pox test/process_pool_test.py main fork
+    cli.run()
@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+from argsense import cli
+
+from lk_utils.subproc import Promise
+from lk_utils.subproc import defer
+
+
+def add(a: int, b: int) -> int:
+    sleep(10e-3)
+    return a + b
+
+
+def fail() -> None:
+    raise KeyError('fail')
+
+
+@cli.cmd()
+def chain() -> None:
+    p = defer(add, 1, 2)
+    q = p.then(lambda x: x * 10).then(lambda x, y: x + y, (5,))
+    p.then(print)
+    assert p.fetch() == 3
+    assert q.fetch() == 35
+
+
+@cli.cmd()
+def manual() -> None:
+    p = Promise()
+    q = p.then(str)
+    assert p.resolve(9)
+    assert not p.resolve(10), 'a promise can only be settled once'
+    assert q.fetch() == '9'
+
+
+@cli.cmd()
+def fan_out(count: int = 1000) -> None:
+    before = threading.active_count()
+    with ThreadPoolExecutor(8) as executor:
+        promises = [
+            defer(add, i, i, __executor__=executor) for i in range(count)
+        ]
+        results = Promise.all(*promises).fetch()
+        print('threads in use', threading.active_count() - before)
+    assert results == [i * 2 for i in range(count)]
+
+
+@cli.cmd()
+def combinators() -> None:
+    try:
+        Promise.all(defer(fail), defer(add, 1, 2)).fetch()
+    except KeyError as e:
+        print('all is rejected', repr(e))
+    assert Promise.any(defer(fail), defer(add, 3, 4)).fetch() == 7
+    slow = defer(sleep, 0.2).then(lambda _: 'slow')
+    assert Promise.race(slow, defer(add, 1, 1)).fetch() == 2
+
+
+if __name__ == '__main__':
+    # pox test/promise_test.py chain
+    # pox test/promise_test.py manual
+    # pox test/promise_test.py fan-out
+    # pox test/promise_test.py combinators
+    cli.run()
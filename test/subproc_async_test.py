@@ -0,0 +1,84 @@
+import asyncio
+import sys
+from time import time
+
+from argsense import cli
+
+from lk_utils import subproc as sp
+
+pyexe = sys.executable
+
+
+@cli.cmd()
+def gather_many(count: int = 50) -> None:
+    async def main() -> list:
+        return await asyncio.gather(*(
+            sp.arun_cmd_args(pyexe, '-c', 'print({})'.format(i))
+            for i in range(count)
+        ))
+
+    start = time()
+    results = asyncio.run(main())
+    assert results == [str(i) for i in range(count)]
+    print('{} commands done in {:.2f}s'.format(count, time() - start))
+
+
+@cli.cmd()
+def batch(max_workers: int = 4) -> None:
+    results = sp.run_cmd_batch(
+        {
+            'alpha': (pyexe, '-c', 'print("hello")'),
+            'beta': (pyexe, '-c', 'import sys; sys.exit(3)'),
+            'gamma': 'echo world',
+        },
+        max_workers=max_workers,
+        verbose=True,
+    )
+    for r in results:
+        print(r.exit_code, r.ok, repr(r.stdout), '{:.3f}s'.format(r.duration))
+    assert [r.exit_code for r in results] == [0, 3, 0]
+
+
+@cli.cmd()
+def batch_fail_fast() -> None:
+    start = time()
+    try:
+        sp.run_cmd_batch(
+            ((pyexe, '-c', 'import time; time.sleep(10)'),
+             (pyexe, '-c', 'import sys; sys.exit(1)')),
+            max_workers=2,
+            fail_fast=True,
+        )
+    except Exception as e:
+        print(':e', e)
+    assert time() - start < 5, 'the slow command should be killed'
+
+
+@cli.cmd()
+def batch_spawn_error() -> None:
+    results = sp.run_cmd_batch(
+        (
+            (pyexe, '-c', 'import time; time.sleep(1); print(1)'),
+            ('no-such-cmd-xyz',),
+            (pyexe, '-c', 'print(2)'),
+        ),
+        max_workers=3,
+    )
+    print([(r.exit_code, r.stdout) for r in results])
+    assert [r.exit_code for r in results] == [0, 127, 0]
+    assert results[0].stdout == '1' and results[2].stdout == '2'
+    assert 'no-such-cmd-xyz' in results[1].stdout
+    try:
+        sp.run_cmd_batch((('no-such-cmd-xyz',),), fail_fast=True)
+    except FileNotFoundError:
+        pass
+    else:
+        raise AssertionError('the spawn error is not raised in fail-fast mode')
+
+
+if __name__ == '__main__':
+    # pox test/subproc_async_test.py gather-many
+    # pox test/subproc_async_test.py batch
+    # pox test/subproc_async_test.py batch-fail-fast
+    # pox test/subproc_async_test.py batch-spawn-error
+    cli.run()
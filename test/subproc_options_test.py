@@ -0,0 +1,246 @@
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from threading import Event
+from time import sleep
+from time import time
+
+import psutil
+from argsense import cli
+
+from lk_utils import subproc as sp
+
+pyexe = sys.executable
+
+
+@cli.cmd()
+def kill_streaming() -> None:
+    lines = []
+    script = 'import time\nwhile True:\n    print("tick", flush=True)\n' \
+             '    time.sleep(0.01)'
+    first = sp.run_cmd_args(
+        pyexe, '-c', script, blocking=False, on_stdout=lines.append
+    )
+    second = sp.run_cmd_args(pyexe, '-c', script, blocking=False)
+    sleep(0.2)
+    assert lines, 'nothing is streamed'
+    first.kill()
+    first.communication_thread.join(max_wait=1)
+    assert not first.communication_thread.is_running
+    assert first.wait(1) is not None
+    # atexit path: a killed process should not stop the others being killed.
+    sp.process_registry.kill_all()
+    assert second.wait(1) is not None
+    print('killed while streaming, {} lines received'.format(len(lines)))
+
+
+@cli.cmd()
+def registry() -> None:
+    exited = []
+    done = Event()
+
+    def on_exit(process: sp.subprocess.Popen) -> None:
+        exited.append(process)
+        done.set()
+
+    sp.process_registry.process_exited.bind(on_exit)
+    short = sp.run_cmd_args(
+        pyexe, '-c', 'import time; time.sleep(0.2)', blocking=False
+    )
+    long = sp.run_cmd_args(
+        pyexe, '-c', 'import time; time.sleep(30)', blocking=False
+    )
+    assert short in sp.process_registry.processes
+    assert long in sp.process_registry.processes
+    assert done.wait(5), 'process_exited is not emitted'
+    assert exited == [short], exited
+    assert short.returncode == 0  # reaped by the watcher.
+    assert sp.process_registry.processes == (long,)
+
+    # the atexit handler only kills the live processes.
+    killed = []
+    short.kill = lambda: killed.append(short)
+    sp.process_registry.kill_all()
+    assert not killed, 'an exited process is killed'
+    assert long.wait(1) is not None
+    start = time()
+    while len(sp.process_registry) and time() - start < 5:
+        sleep(10e-3)
+    assert exited == [short, long], exited
+    assert len(sp.process_registry) == 0
+    sp.process_registry.process_exited.unbind(on_exit)
+    print('registered, announced and killed as expected')
+
+
+@cli.cmd()
+def tail_capture(count: int = 200_000) -> None:
+    script = 'for i in range({}):\n    print("line", i)'.format(count)
+    lines = ['line {}'.format(i) for i in range(count)]
+
+    out = sp.run_cmd_args(pyexe, '-c', script, tail_lines=10)
+    assert out == '\n'.join(lines[-10:]), out
+    out = asyncio.run(sp.arun_cmd_args(pyexe, '-c', script, tail_lines=10))
+    assert out == '\n'.join(lines[-10:]), out
+
+    out = sp.run_cmd_args(pyexe, '-c', script, tail_bytes=100)
+    assert len(out.encode()) + 1 <= 100, out
+    kept = out.split('\n')
+    assert kept == lines[-len(kept):], out
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, 'out.log')
+        out = sp.run_cmd_args(pyexe, '-c', script, log_file=log_file)
+        with open(log_file, encoding='utf-8') as f:
+            assert f.read() == out + '\n', 'log file does not match stdout'
+        # the log file keeps everything even if only the tail is returned.
+        out = sp.run_cmd_args(
+            pyexe, '-c', script, tail_lines=5, log_file=log_file
+        )
+        assert out == '\n'.join(lines[-5:]), out
+        with open(log_file, encoding='utf-8') as f:
+            assert f.read().splitlines() == lines
+    print('kept the tail of {} lines'.format(count))
+
+
+@cli.cmd()
+def usage(mb: int = 64) -> None:
+    script = (
+        'import time\n'
+        'data = bytearray({})\n'
+        'data[::4096] = b"x" * len(data[::4096])\n'  # touch every page.
+        'time.sleep(0.5)'.format(mb * 1024**2)
+    )
+    usages = []
+    done = Event()
+
+    def on_usage(usage: sp.ResourceUsage) -> None:
+        usages.append(usage)
+        done.set()
+
+    sp.run_cmd_args(pyexe, '-c', script, on_usage=on_usage)
+    assert done.wait(5), 'on_usage is not called'
+    print(usages[0])
+    assert usages[0].peak_rss >= mb * 1024**2, usages[0]
+    assert usages[0].wall_time >= 0.5, usages[0]
+
+    process = sp.run_cmd_args(pyexe, '-c', script, blocking=False, measure=True)
+    process.wait()
+    start = time()
+    while process.usage.wall_time == 0 and time() - start < 5:
+        sleep(10e-3)  # the final sample is taken by the watcher thread.
+    print(process.usage)
+    assert process.usage.peak_rss >= mb * 1024**2, process.usage
+
+    done.clear()
+    asyncio.run(sp.arun_cmd_args(pyexe, '-c', script, on_usage=on_usage))
+    assert done.wait(5), 'on_usage is not called'
+    print(usages[1])
+    assert usages[1].peak_rss > 0, usages[1]
+
+
+@cli.cmd()
+def scheduling(nice: int = 5) -> None:
+    """
+    the options are set before the command runs, so the child and its own
+    children see them from the first instruction.
+    """
+    cpus = sorted(os.sched_getaffinity(0))[:1]
+    script = (
+        'import os, subprocess\n'
+        'print(os.getpriority(os.PRIO_PROCESS, 0))\n'
+        'print(sorted(os.sched_getaffinity(0)))\n'
+        'print(subprocess.run(["nice"], capture_output=True, text=True)'
+        '.stdout.strip())'
+    )
+    expected = '{}\n{}\n{}'.format(nice, cpus, nice)
+    for _ in range(5):
+        out = sp.run_cmd_args(
+            pyexe, '-c', script, nice=nice, cpu_affinity=cpus
+        )
+        assert out == expected, out
+    out = asyncio.run(sp.arun_cmd_args(
+        pyexe, '-c', script, nice=nice, cpu_affinity=cpus
+    ))
+    assert out == expected, out
+    print('child and grandchild see nice={}, affinity={}'.format(nice, cpus))
+
+    # ionice is set by the parent right after the child starts.
+    out = sp.run_cmd_args(
+        pyexe, '-c',
+        'import time, psutil; time.sleep(0.2); '
+        'print(int(psutil.Process().ionice().ioclass))',
+        ionice=psutil.IOPRIO_CLASS_IDLE,
+    )
+    assert out == str(int(psutil.IOPRIO_CLASS_IDLE)), out
+
+
+@cli.cmd()
+def pipeline_early_exit() -> None:
+    # `yes` is killed by SIGPIPE when `head` exits, which is not a failure.
+    start = time()
+    assert sp.run_cmd_pipeline('yes', 'head -1') == 'y'
+    print('done in {:.2f}s'.format(time() - start))
+
+
+@cli.cmd()
+def pipeline_failing_stage() -> None:
+    middle = (
+        pyexe, '-c',
+        'import sys; sys.stderr.write("middle failed\\n"); sys.exit(3)'
+    )
+    try:
+        sp.run_cmd_pipeline((pyexe, '-c', 'print("a")'), middle, 'cat')
+    except Exception as e:
+        msg = str(e)
+        assert 'exit code 3' in msg, msg
+        assert 'sys.exit(3)' in msg, msg  # the failed stage, not `cat`.
+    else:
+        raise AssertionError('the failure of the middle stage is ignored')
+    assert sp.run_cmd_pipeline(
+        (pyexe, '-c', 'print("a")'), middle, 'cat', ignore_error=True
+    ) == ''
+    print('the failed stage is reported')
+
+
+@cli.cmd()
+def pipeline_quiet() -> None:
+    noisy = (
+        pyexe, '-c', 'import sys; sys.stderr.write("noise\\n"); print("a")'
+    )
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        assert sp.run_cmd_pipeline(noisy, 'cat') == 'a'
+    assert 'noise' not in buf.getvalue(), 'upstream stderr is printed'
+    with contextlib.redirect_stdout(buf):
+        sp.run_cmd_pipeline(noisy, 'cat', verbose=True)
+    assert 'noise' in buf.getvalue(), 'upstream stderr is not printed'
+    print('upstream stderr follows verbose')
+
+
+@cli.cmd()
+def pipeline_spawn_error() -> None:
+    try:
+        sp.run_cmd_pipeline('yes', 'definitely-not-a-command-xyz')
+    except FileNotFoundError:
+        pass
+    else:
+        raise AssertionError('the spawn error is not raised')
+    # `yes` is not left blocked on the pipe.
+    assert not psutil.Process().children(), psutil.Process().children()
+    print('the started stages are cleaned up')
+
+
+if __name__ == '__main__':
+    # pox test/subproc_options_test.py kill-streaming
+    # pox test/subproc_options_test.py registry
+    # pox test/subproc_options_test.py scheduling
+    # pox test/subproc_options_test.py tail-capture
+    # pox test/subproc_options_test.py usage
+    # pox test/subproc_options_test.py pipeline-early-exit
+    # pox test/subproc_options_test.py pipeline-failing-stage
+    # pox test/subproc_options_test.py pipeline-quiet
+    # pox test/subproc_options_test.py pipeline-spawn-error
+    cli.run()
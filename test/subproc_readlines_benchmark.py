@@ -0,0 +1,116 @@
+"""
+compare the chunked line reader of `run_cmd_args` with the legacy one-byte
+reader, on a synthetic child process which prints a lot of noisy output.
+"""
+import subprocess as sp
+import sys
+import typing as t
+from time import perf_counter
+
+from argsense import cli
+
+from lk_utils.subproc.subprocess import _readlines
+
+_NOISY_CHILD = '''
+import sys
+out = sys.stdout.buffer
+line = b'x' * 78
+for i in range({count}):
+    if i % 50 == 0:
+        out.write(b'progress %d%%\\r' % (i * 100 // {count}))
+    out.write(line + b'\\n')
+out.flush()
+'''
+
+_LONG_LINE_CHILD = '''
+import sys
+out = sys.stdout.buffer
+block = b'x' * 65536
+for _ in range({size} // 65536):
+    out.write(block)
+    out.flush()
+out.write(b'\\n')
+out.flush()
+'''
+
+
+def _legacy_readlines(source: t.IO) -> t.Iterator[str]:
+    # copied from the original `run_cmd_args.communicate.readlines`.
+    last: bytes = b''
+    curr: bytes
+    temp: bytes = b''
+    while True:
+        if curr := source.read(1):
+            if curr == b'\n':
+                temp += curr
+                yield temp.decode(errors='ignore')
+                temp = b''
+            elif last == b'\r':
+                yield temp.decode(errors='ignore')
+                temp = curr
+            else:
+                temp += curr
+            last = curr
+        else:
+            break
+    if temp:
+        yield (temp + b'\n').decode(errors='ignore')
+
+
+def _measure(reader: t.Callable, script: str) -> t.Tuple[float, int, int]:
+    proc = sp.Popen((sys.executable, '-c', script), stdout=sp.PIPE)
+    start = perf_counter()
+    lines = 0
+    size = 0
+    for line in reader(proc.stdout):
+        lines += 1
+        size += len(line)
+    proc.wait()
+    return perf_counter() - start, lines, size
+
+
+@cli.cmd()
+def main(count: int = 200_000) -> None:
+    """
+    params:
+        count: how many lines the child process prints. each line is 79 bytes.
+    """
+    for name, reader in (
+        ('legacy (read 1 byte)', _legacy_readlines),
+        ('chunked (os.read 64k)', _readlines),
+    ):
+        duration, lines, size = _measure(
+            reader, _NOISY_CHILD.format(count=count)
+        )
+        print(
+            '{:<24} {:>8} lines  {:>7.2f} MB  {:>7.3f}s  {:>8.2f} MB/s'.format(
+                name, lines, size / 1e6, duration, size / 1e6 / duration
+            ),
+            ':s1',
+        )
+
+
+@cli.cmd()
+def long_line(mb: int = 8) -> None:
+    """
+    the child prints one line of n megabytes without line break until the
+    end, flushed in 64k blocks. the time of the chunked reader should grow
+    linearly with the size. (the legacy reader is not measured here, its
+    `bytes +=` is quadratic and takes forever.)
+    """
+    durations = []
+    for size in (mb, mb * 2, mb * 4):
+        duration, lines, _ = _measure(
+            _readlines, _LONG_LINE_CHILD.format(size=size * 1024 * 1024)
+        )
+        assert lines == 1, lines
+        durations.append(duration)
+        print('{:>4} MB line  {:>7.3f}s'.format(size, duration), ':s1')
+    assert durations[2] < durations[0] * 8, 'not linear'
+
+
+if __name__ == '__main__':
+    # pox test/subproc_readlines_benchmark.py main
+    # pox test/subproc_readlines_benchmark.py main 1000000
+    # pox test/subproc_readlines_benchmark.py long-line
+    cli.run()
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+from concurrent.futures import as_completed
+from time import process_time
+from time import sleep
+from time import time
+
+from argsense import cli
+
+from lk_utils import subproc as sp
+
+
+@cli.cmd()
+def pool(count: int = 200, max_workers: int = 4) -> None:
+    sp.set_thread_pool('test_pool', max_workers, max_queue=8)
+
+    @sp.new_thread(group='test_pool')
+    def job(i: int) -> int:
+        sleep(10e-3)
+        return i * 2
+
+    before = threading.active_count()
+    threads = [job(i) for i in range(count)]
+    print('threads in use', threading.active_count() - before)
+    assert threading.active_count() - before <= max_workers
+    assert [x.join() for x in threads] == [i * 2 for i in range(count)]
+
+
+@cli.cmd()
+def set_pool() -> None:
+    sp.set_thread_pool('test_set_pool', 2)
+
+    @sp.new_thread(group='test_set_pool', singleton=True)
+    def job(i: int) -> int:
+        return threading.current_thread().ident
+
+    retention = sp.thread_manager.retention
+    sp.thread_manager.retention = 1  # keep the finished singleton.
+    try:
+        thread = job(0)
+        old_worker = thread.join()
+        # replace the pool, the retained singleton should follow the new one.
+        sp.set_thread_pool('test_set_pool', 1)
+        assert job(1) is thread
+        new_worker = thread.join()
+        assert new_worker != old_worker
+        # back to one-thread-per-call mode.
+        sp.set_thread_pool('test_set_pool', 0)
+        assert job(2) is thread
+        assert thread.join() not in (old_worker, new_worker)
+    finally:
+        sp.thread_manager.retention = retention
+    print('the retained thread follows the replaced pool')
+
+@cli.cmd()
+def singleton() -> None:
+    calls = []
+
+    @sp.new_thread(singleton=True)
+    def save(i: int) -> None:
+        sleep(50e-3)
+        calls.append(i)
+
+    threads = [save(i) for i in range(5)]
+    assert all(x is threads[0] for x in threads)
+    threads[0].join()
+    print('queued', calls)
+    assert calls == [0, 1, 2, 3, 4]
+
+
+@cli.cmd()
+def coalesce() -> None:
+    calls = []
+
+    @sp.new_thread(singleton=True, coalesce=True)
+    def rebuild(i: int) -> None:
+        sleep(50e-3)
+        calls.append(i)
+
+    for i in range(10):
+        thread = rebuild(i)
+    thread.join()
+    print('coalesced', calls)
+    assert calls == [0, 9]
+
+
+@cli.cmd()
+def futures(count: int = 300) -> None:
+    start = time()
+    threads = [sp.run_new_thread(sleep, 50e-3) for _ in range(count)]
+    for x in threads:
+        x.join()
+    print('joined {} threads in {:.3f}s'.format(count, time() - start))
+
+    threads = [sp.run_new_thread(lambda i=i: i) for i in range(count)]
+    done = sorted(f.result() for f in as_completed(x.future for x in threads))
+    assert done == list(range(count))
+
+    async def main() -> int:
+        return await asyncio.wrap_future(sp.run_new_thread(lambda: 7).future)
+
+    assert asyncio.run(main()) == 7
+
+    slow = sp.run_new_thread(sleep, 0.5)
+    try:
+        slow.join(max_wait=0.1)
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError('join does not time out')
+    # a positional float was the polling interval, it still blocks.
+    assert sp.run_new_thread(sleep, 0.3).join(10e-3) is None
+    start = process_time()
+    slow.join()  # blocks without waking up periodically.
+    print('cpu time of joining: {:.1f}ms'.format((process_time() - start) * 1000))
+
+
+@cli.cmd()
+def stats(count: int = 10) -> None:
+    sp.set_thread_pool('test_stats', 2)
+
+    @sp.new_thread(group='test_stats')
+    def job(i: int) -> int:
+        sleep(20e-3)
+        if i % 5 == 0:
+            raise ValueError(i)
+        return i
+
+    threads = [job(i) for i in range(count)]
+    print(sp.thread_manager.stats('test_stats'))
+    for x in threads:
+        x.join()
+    sleep(10e-3)
+    result = sp.thread_manager.stats('test_stats')['test_stats']
+    print(result)
+    assert result['finished'] == count
+    assert result['failed'] == (count + 4) // 5
+    assert 'test_stats' not in sp.thread_manager.thread_pool, 'not evicted'
+
+
+if __name__ == '__main__':
+    # pox test/threading_test.py pool
+    # pox test/threading_test.py set-pool
+    # pox test/threading_test.py singleton
+    # pox test/threading_test.py coalesce
+    # pox test/threading_test.py futures
+    # pox test/threading_test.py stats
+    cli.run()